@@ -1,24 +1,28 @@
 import sys
 import os
-import shutil
-import re
+import json
+import queue
 import logging
-import requests
-import time
-import threading
+import logging.handlers
+import multiprocessing
 from datetime import datetime
-from urllib.parse import urlparse
 from collections import deque
 
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QFrame, QStackedWidget, QLineEdit,
     QListWidget, QListWidgetItem, QGraphicsDropShadowEffect, QGridLayout, QSizePolicy,
-    QCheckBox, QDialog, QTextEdit, QFileDialog, QMessageBox, QSpinBox, QComboBox
+    QCheckBox, QDialog, QTextEdit, QFileDialog, QMessageBox, QSpinBox, QComboBox, QListView
 )
-from PySide6.QtCore import Qt, QSize, QPoint, Signal, QObject, QTimer, QMimeData
+from PySide6.QtCore import Qt, QSize, QPoint, Signal, QObject, QTimer, QMimeData, QAbstractListModel, QModelIndex
 from PySide6.QtGui import QColor, QPainter, QPen, QIcon, QPixmap, QFont, QDragEnterEvent, QDropEvent
 
+from md_assistant.core import MarkdownLogicCore, INPLACE_WORKERS
+from md_assistant.fetch import DOWNLOAD_WORKERS, DOWNLOAD_PER_HOST, DOWNLOAD_MAX_MB, DOWNLOAD_CACHE_NAME
+from md_assistant.journal import JournalPending, pending, recover
+from md_assistant.scheduler import TaskScheduler, PRIORITY_PREVIEW
+from md_assistant.metrics import KIND_NAMES
+
 # ============================================================================
 # 1. 视觉样式 (Wide Soft Theme)
 # ============================================================================
@@ -97,7 +101,7 @@ QSpinBox::up-arrow {{ image: {ARROW_UP}; width: 10px; height: 10px; }}
 QSpinBox::down-arrow {{ image: {ARROW_DOWN}; width: 10px; height: 10px; }}
 
 /* 预览框 */
-QTextEdit {{
+QTextEdit, QListView {{
     background: #F9FAFB; border: 1px solid #EEE; border-radius: 12px; padding: 10px;
     color: #555; font-family: Consolas; font-size: 13px;
 }}
@@ -250,330 +254,54 @@ class LaunchCard(QPushButton):
         super().leaveEvent(e)
 
 # ============================================================================
-# 5. 业务逻辑
+# 5. 业务逻辑桥接（引擎见 md_assistant/core.py）
 # ============================================================================
-class MarkdownLogicCore(QObject):
-    log_signal           = Signal(str)
+class CoreBridge(QObject):
+    """把引擎的纯 Python 事件转发为 Qt Signal：工作线程中触发时由 Qt 排队回 GUI 线程"""
+    log_batch            = Signal(list)
+    progress             = Signal(dict)
     task_finished        = Signal(bool, str)
     scan_finished        = Signal(list)
     info_ready           = Signal(dict)
-    rename_preview_ready = Signal(str)   # (preview_text,)
-    rename_count_ready   = Signal(int)   # 改进4：传递文件数
-    undo_available       = Signal(int)   # 改进8：传可撤销步数（0=不可撤销）
+    rename_preview_ready = Signal(object)
+    rename_count_ready   = Signal(int)
+    undo_available       = Signal(int)
+    stats_ready          = Signal(object)
 
-    def __init__(self):
+    def __init__(self, core):
         super().__init__()
-        self.img_pattern = r'!\[.*?\]\((.*?)\)'
-        self.rename_history = []
-        self._cancel = threading.Event()  # 改进9：取消标志
-
-    def log(self, msg): self.log_signal.emit(msg); logging.info(msg)
-    def normalize_path(self, path): return os.path.normpath(path.strip()).replace("\\", "/")
-
-    def cancel(self):
-        """通知正在运行的长任务停止"""
-        self._cancel.set()
-
-    def _reset_cancel(self):
-        self._cancel.clear()
-
-    def _get_unique_path(self, target_dir, filename):
-        new_path = os.path.join(target_dir, filename)
-        base, ext = os.path.splitext(filename); counter = 1
-        while os.path.exists(new_path):
-            new_path = os.path.join(target_dir, f"{base}_{counter}{ext}"); counter += 1
-        return new_path
-
-    # --- Rename Logic ---
-    def execute_rename_batch(self, folder, pattern, start_num, pad):
-        if not os.path.isdir(folder): return self.task_finished.emit(False, "无效文件夹")
-        try:
-            files = sorted([f for f in os.listdir(folder) if f.lower().endswith(".md")])
-            if not files: return self.task_finished.emit(False, "无 MD 文件")
-            trans, succ = [], 0
-            self.log(f"--- [重命名] 开始: {len(files)} 文件 ---")
-            for i, old in enumerate(files):
-                base, ext = os.path.splitext(old)
-                new = (pattern
-                       .replace("{original}", base)
-                       .replace("{num}", str(start_num + i).zfill(pad))
-                       .replace("{date}", datetime.now().strftime("%Y%m%d"))) + ext
-                op = os.path.join(folder, old)
-                if old != new:
-                    np = self._get_unique_path(folder, new)
-                    try:
-                        os.rename(op, np); trans.append((np, op)); succ += 1
-                        self.log(f"Ren: {old} -> {os.path.basename(np)}")
-                    except Exception as e:
-                        self.log(f"[错误] 重命名 {old} 失败: {e}")
-            if trans:
-                self.rename_history.append(trans)
-                self.undo_available.emit(len(self.rename_history))
-                self.task_finished.emit(True, f"成功重命名 {succ} 个文件")
-            else:
-                self.task_finished.emit(True, "无变更")
-        except Exception as e:
-            self.task_finished.emit(False, str(e))
-
-    def undo_last_rename(self):
-        if not self.rename_history: return self.task_finished.emit(False, "无撤销记录")
-        trans = self.rename_history.pop(); cnt = 0
-        for cp, op in reversed(trans):
-            if os.path.exists(cp):
-                try: os.rename(cp, op); cnt += 1
-                except Exception as e: self.log(f"[错误] 撤销失败: {e}")
-        self.undo_available.emit(len(self.rename_history))
-        self.task_finished.emit(True, f"已撤销 {cnt} 个文件")
-
-    def generate_rename_preview(self, folder, pattern, start, pad):
-        if not folder or not os.path.isdir(folder):
-            self.rename_count_ready.emit(0)
-            return
-        try:
-            files = sorted([f for f in os.listdir(folder) if f.lower().endswith(".md")])
-            t = f"预览 {len(files)} 个文件:\n" + "-"*30 + "\n"
-            for i, old in enumerate(files):
-                new = (pattern
-                       .replace("{original}", os.path.splitext(old)[0])
-                       .replace("{num}", str(start+i).zfill(pad))
-                       .replace("{date}", datetime.now().strftime("%Y%m%d"))
-                       ) + os.path.splitext(old)[1]
-                t += f"{old} -> {new}\n"
-            self.rename_preview_ready.emit(t)
-            self.rename_count_ready.emit(len(files))   # 改进4
-        except Exception as e:
-            self.log(f"[错误] 预览生成失败: {e}")
-            self.rename_count_ready.emit(0)
-
-    # --- Audit Logic ---
-    def analyze_path_entry(self, ipath):
-        self.log(f"--- [审计] {ipath} ---")
-        if os.path.isfile(ipath): self._analyze_single(ipath)
-        elif os.path.isdir(ipath): self._analyze_batch(ipath)
-        else: self.task_finished.emit(False, "路径无效")
-
-    def _analyze_batch(self, root):
-        mds = [os.path.join(r, x) for r, _, fs in os.walk(root) for x in fs if x.endswith('.md')]
-        # 改进6：全局 union，去重后再统计
-        all_ref_abs, all_img_abs = set(), set()
-        for m in mds:
-            r = self._core_audit(m)
-            if r:
-                all_ref_abs |= r['ref_abs']
-                all_img_abs |= r['img_abs']
-        reds = list(all_img_abs - all_ref_abs)
-        self.info_ready.emit({
-            "md_cnt":  len(mds),
-            "ref_cnt": len(all_ref_abs),
-            "phy_cnt": len(all_img_abs),
-            "red_cnt": len(reds),
-            "red_list": reds,
-            "scan_root": root,
-        })
-
-    def _analyze_single(self, fpath):
-        r = self._core_audit(fpath)
-        if r:
-            reds = list(r['img_abs'] - r['ref_abs'])
-            self.info_ready.emit({
-                "md_cnt":  1,
-                "ref_cnt": len(r['ref_abs']),
-                "phy_cnt": len(r['img_abs']),
-                "red_cnt": len(reds),
-                "red_list": reds,
-                "scan_root": os.path.dirname(fpath),
-            })
-
-    def _core_audit(self, fpath):
-        """返回 {ref_abs: set[str], img_abs: set[str]}，路径均为 normpath 绝对路径"""
-        try:
-            md_dir = os.path.dirname(fpath)
-            with open(fpath, 'r', encoding='utf-8', errors='ignore') as f:
-                c = f.read()
-            ref_abs = set()
-            for m in re.findall(self.img_pattern, c):
-                if m.startswith('http'): continue
-                ref_abs.add(os.path.normpath(os.path.join(md_dir, self.normalize_path(m))))
-
-            img_exts = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.bmp', '.tiff', '.ico'}
-            img_abs = set()
-            for root, dirs, files in os.walk(md_dir):
-                dirs[:] = [d for d in dirs if d != 'unused_backup']
-                for fn in files:
-                    if os.path.splitext(fn)[1].lower() in img_exts:
-                        img_abs.add(os.path.normpath(os.path.join(root, fn)))
-            return {"ref_abs": ref_abs, "img_abs": img_abs}
-        except Exception as e:
-            self.log(f"[错误] 审计 {os.path.basename(fpath)} 失败: {e}")
-            return None
-
-    def cleanup_files(self, fl, forever):
-        cnt = 0
-        for p in fl:
-            if os.path.exists(p):
-                try:
-                    if forever:
-                        os.remove(p); self.log(f"[删] {os.path.basename(p)}")
-                    else:
-                        bd = os.path.join(os.path.dirname(p), "unused_backup")
-                        os.makedirs(bd, exist_ok=True)
-                        shutil.move(p, os.path.join(bd, os.path.basename(p)))
-                        self.log(f"[移] {os.path.basename(p)}")
-                    cnt += 1
-                except Exception as e:
-                    self.log(f"[错误] 清理失败: {e}")
-        return cnt
-
-    # --- Migration Logic ---
-    def process_migration(self, src, dst, cfg):
-        self._reset_cancel()
-        try:
-            fs = []
-            if os.path.isfile(src): fs = [src]
-            elif os.path.isdir(src):
-                fs = [os.path.join(r, f) for r, _, x in os.walk(src) for f in x if f.endswith('.md')]
-
-            if not fs: return self.task_finished.emit(False, "无 MD 文件")
-
-            out_md = os.path.abspath(os.path.join(dst, "合并后的文档.md"))
-            fs = [f for f in fs if os.path.abspath(f) != out_md]
-
-            merged, procs = "", []
-            self.log(f"--- [迁移] {len(fs)} 文件 -> {dst} ---")
-
-            for f in fs:
-                if self._cancel.is_set():   # 改进9：检查取消
-                    self.task_finished.emit(False, "已取消")
-                    return
-                self.log(f"处理: {os.path.basename(f)}")
-                cnt = self._mig_core(f, dst, cfg); procs.append(cnt)
-                if cfg['merge']: merged += f"\n\n# {os.path.basename(f)}\n\n" + cnt
-
-            if cfg['merge'] and merged:
-                with open(out_md, 'w', encoding='utf-8') as f: f.write(merged)
-                self.log(f"合并完成: {out_md}")
-
-            unused = self._scan_unused(procs, dst) if cfg['cleanup'] else []
-            self.scan_finished.emit(unused)
-            self.task_finished.emit(True, f"迁移成功！已处理 {len(fs)} 个文件。")
-        except Exception as e:
-            self.task_finished.emit(False, str(e))
-
-    def _mig_core(self, fpath, root, cfg):
-        name = os.path.splitext(os.path.basename(fpath))[0]
-        tdir = os.path.join(root, "images", name) if cfg['subfolder'] else os.path.join(root, "images")
-        os.makedirs(tdir, exist_ok=True)
-        with open(fpath, 'r', encoding='utf-8') as f:
-            txt = f.read()
-        for u in re.findall(self.img_pattern, txt):
-            new_abs = ""
-            if u.startswith('http'):
-                if cfg['download']:
-                    try:
-                        r = requests.get(u, timeout=10)
-                        n = os.path.basename(urlparse(u).path)
-                        if not n or '.' not in n:
-                            cd = r.headers.get('Content-Disposition', '')
-                            m = re.search(r'filename=["\']?([^"\';\s]+)', cd)
-                            n = m.group(1) if m else f"web_{int(time.time())}.jpg"
-                        p = self._get_unique_path(tdir, n)
-                        with open(p, 'wb') as wf: wf.write(r.content)
-                        new_abs = p
-                        self.log(f" [下载] {n}")
-                    except Exception as e:
-                        self.log(f"[错误] 下载 {u} 失败: {e}")
-            else:
-                src = os.path.abspath(os.path.join(os.path.dirname(fpath), self.normalize_path(u)))
-                if os.path.exists(src):
-                    new_abs = self._get_unique_path(tdir, os.path.basename(src))
-                    shutil.copy2(src, new_abs)
-
-            if new_abs:
-                sub = f"{name}/" if cfg['subfolder'] else ""
-                rel = f"./images/{sub}{os.path.basename(new_abs)}".replace("//", "/")
-                txt = re.sub(
-                    r'(!\[.*?\]\()' + re.escape(u) + r'(\))',
-                    lambda mo: mo.group(1) + rel + mo.group(2),
-                    txt
-                )
-
-        if not cfg.get('merge'):
-            with open(os.path.join(root, os.path.basename(fpath)), 'w', encoding='utf-8') as f:
-                f.write(txt)
-        return txt
-
-    def _scan_unused(self, cnts, root):
-        refs = {os.path.basename(self.normalize_path(r))
-                for c in cnts for r in re.findall(self.img_pattern, c)}
-        u = []
-        img_root = os.path.join(root, "images")
-        if os.path.exists(img_root):
-            for r, _, fs in os.walk(img_root):
-                if "unused" in r: continue
-                for f in fs:
-                    if f not in refs: u.append(os.path.join(r, f))
-        return u
-
-    # --- Inplace Logic ---
-    def process_inplace(self, folder, cln):
-        self._reset_cancel()
-        try:
-            fs = [f for f in os.listdir(folder) if f.endswith('.md')]
-            if not fs: return self.task_finished.emit(False, "无 MD 文件")
-            self.log(f"--- [原地] 处理 {len(fs)} 文件 ---")
-            procs = []
-            for fn in fs:
-                if self._cancel.is_set():   # 改进9
-                    self.task_finished.emit(False, "已取消")
-                    return
-                fp = os.path.join(folder, fn)
-                md_dir = os.path.dirname(fp)
-                pfx = os.path.splitext(fn)[0]
-                img_dir = os.path.join(md_dir, "images")
-                os.makedirs(img_dir, exist_ok=True)
-                with open(fp, 'r', encoding='utf-8') as f:
-                    txt = f.read()
-                local_count = 0
-                for u in re.findall(self.img_pattern, txt):
-                    if u.startswith(('http', './images/')): continue
-                    src = os.path.join(md_dir, self.normalize_path(u))
-                    if os.path.exists(src):
-                        nn = f"{pfx}_{local_count+1}{os.path.splitext(src)[1]}"
-                        shutil.move(src, os.path.join(img_dir, nn))
-                        txt = re.sub(
-                            r'(!\[.*?\]\()' + re.escape(u) + r'(\))',
-                            lambda mo, r=f"./images/{nn}": mo.group(1) + r + mo.group(2),
-                            txt
-                        )
-                        self.log(f" [整理] {os.path.basename(src)} -> {nn}")
-                        local_count += 1
-                with open(fp, 'w', encoding='utf-8') as f:
-                    f.write(txt)
-                procs.append(txt)
-            u = self._scan_unused(procs, folder) if cln else []
-            self.scan_finished.emit(u)
-            self.task_finished.emit(True, f"整理完成！已处理 {len(fs)} 个文件。")
-        except Exception as e:
-            self.task_finished.emit(False, str(e))
+        self.core = core
+        for name in core.EVENTS:
+            getattr(core, name).connect(getattr(self, name).emit)
 
-    def scan_inplace_preview(self, folder):
-        """改进3：扫描原地整理会影响哪些文件，不写磁盘"""
-        try:
-            img_exts = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.bmp', '.tiff', '.ico'}
-            md_files = [f for f in os.listdir(folder) if f.endswith('.md')]
-            img_count = 0
-            for fn in md_files:
-                fp = os.path.join(folder, fn)
-                with open(fp, 'r', encoding='utf-8', errors='ignore') as f:
-                    txt = f.read()
-                for u in re.findall(self.img_pattern, txt):
-                    if u.startswith(('http', './images/')): continue
-                    src = os.path.join(folder, self.normalize_path(u))
-                    if os.path.exists(src) and os.path.splitext(src)[1].lower() in img_exts:
-                        img_count += 1
-            return len(md_files), img_count
-        except Exception:
-            return 0, 0
+
+class SchedulerBridge(QObject):
+    """把调度器的队列变化与任务完成事件转发到 GUI 线程"""
+    changed  = Signal(int, int)
+    finished = Signal(object)
+
+    def __init__(self, scheduler):
+        super().__init__()
+        scheduler.changed.connect(self.changed.emit)
+        scheduler.finished.connect(self.finished.emit)
+
+
+class RenamePreviewModel(QAbstractListModel):
+    """重命名预览列表：只在视图需要绘制某行时才向 RenamePreview 取该行"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.plan = None
+
+    def set_plan(self, plan):
+        self.beginResetModel(); self.plan = plan; self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or self.plan is None else len(self.plan)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid(): return None
+        old, new = self.plan[index.row()]
+        return f"{old} -> {new}"
 
 # ============================================================================
 # 6. 主窗口
@@ -597,13 +325,25 @@ class EStarApp(QMainWindow):
                 app.setWindowIcon(QIcon(_icon_path))
 
         self.core = MarkdownLogicCore()
-        self.core.log_signal.connect(self.append_log)
-        self.core.task_finished.connect(self.on_task_done)
-        self.core.scan_finished.connect(self.on_scan_done)
-        self.core.info_ready.connect(self.on_info_ready)
-        self.core.rename_preview_ready.connect(self.on_ren_preview)
-        self.core.rename_count_ready.connect(self.on_ren_count)     # 改进4
-        self.core.undo_available.connect(self.on_undo_state_change) # 改进8
+        self.bridge = CoreBridge(self.core)
+        self.bridge.log_batch.connect(self.append_logs)
+        self.bridge.progress.connect(self.on_progress)
+        self.bridge.task_finished.connect(self.on_task_done)
+        self.bridge.scan_finished.connect(self.on_scan_done)
+        self.bridge.info_ready.connect(self.on_info_ready)
+        self.bridge.rename_preview_ready.connect(self.on_ren_preview)
+        self.bridge.rename_count_ready.connect(self.on_ren_count)     # 改进4
+        self.bridge.undo_available.connect(self.on_undo_state_change) # 改进8
+        self.bridge.stats_ready.connect(self.on_stats_ready)
+
+        # 所有后台操作经由有界线程池调度，每个任务有自己的取消标志
+        self.scheduler = TaskScheduler()
+        self.sched_bridge = SchedulerBridge(self.scheduler)
+        self.sched_bridge.changed.connect(self.on_queue_changed)
+        self.sched_bridge.finished.connect(self.on_sched_task_done)
+        self._mig_task = self._inp_task = self._watch_task = self._undo_task = None
+        self._preview_gen = 0   # 预览请求编号：只显示最近一次请求的结果
+        self._busy_tasks = {}   # Task -> (忙碌中的按钮, 取消按钮)；任务结束时只恢复它自己的按钮
 
         # 防抖计时器（改进：按键防抖）
         self._preview_timer = QTimer(self)
@@ -616,6 +356,7 @@ class EStarApp(QMainWindow):
         self._busy = False   # 改进2：忙碌标志
 
         self.recent_logs = deque(maxlen=100)
+        self.recent_stats = deque(maxlen=20)   # 最近各次操作的运行统计（RunStats）
         self.current_log_file = f"EStar_{datetime.now().strftime('%Y%m%d')}.log"
         self.setup_logging()
 
@@ -636,16 +377,65 @@ class EStarApp(QMainWindow):
         self.init_tool_page(3, "批量重命名", "BATCH RENAME",   self.ui_rename_content)
         self.init_tool_page(4, "原地整理",   "INPLACE FIX",    self.ui_inplace_content)
 
+        # 撤销历史持久保存，启动时恢复撤销按钮状态
+        self.on_undo_state_change(len(self.core.history))
+
+    def run_task(self, name, fn, priority=0, key=None, exclusive=False, fork=True, btn=None, cancel=None):
+        """提交后台任务：fn(core) 在调度器线程中执行；fork=True 时使用带本任务取消标志的独立引擎，
+        fork=False 时以 fn(主引擎, 取消标志) 调用。
+        btn / cancel 为本任务置为忙碌的按钮与显示出来的取消按钮，任务结束（含排队中被取消）时恢复"""
+        run = (lambda tok: fn(self.core.fork(tok))) if fork else (lambda tok: fn(self.core, tok))
+        task = self.scheduler.submit(name, run, priority, key, exclusive)
+        if btn is not None or cancel is not None: self._busy_tasks[task] = (btn, cancel)
+        return task
+
+    def on_queue_changed(self, running, queued):
+        self.lbl_tasks.setText(f"后台任务：运行 {running} · 排队 {queued}" if running or queued else "")
+
+    def on_sched_task_done(self, task):
+        if task.key == "preview": return
+        self._restore_task_buttons(task)
+        state = {"done": "完成", "cancelled": "已取消", "failed": "失败"}.get(task.state, task.state)
+        self.append_log(f"[任务] {task.name} {state}：排队 {task.waited:.1f}s，运行 {task.elapsed:.1f}s")
+        if task.state == "failed": self.on_task_done(False, f"{task.name}出错：{task.error}")
+
+    def closeEvent(self, e):
+        self.scheduler.shutdown()
+        self.core.flush_log()
+        self._log_listener.stop()
+        super().closeEvent(e)
+
     def navigate_to(self, idx): self.stack.setCurrentIndex(idx)
     def go_home(self): self.stack.setCurrentIndex(0)
 
     def setup_logging(self):
-        logging.basicConfig(filename=self.current_log_file, level=logging.INFO,
-                            format='%(asctime)s %(message)s', encoding='utf-8')
+        # 日志文件由监听线程写入，记录日志的线程只把记录放入队列，不等磁盘
+        fh = logging.FileHandler(self.current_log_file, encoding='utf-8')
+        fh.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        q = queue.SimpleQueue()
+        self._log_listener = logging.handlers.QueueListener(q, fh)
+        self._log_listener.start()
+        root = logging.getLogger()
+        root.addHandler(logging.handlers.QueueHandler(q)); root.setLevel(logging.INFO)
 
     def append_log(self, t):
         self.recent_logs.append(f"[{datetime.now().strftime('%H:%M:%S')}] {t}")
 
+    def append_logs(self, batch):
+        ts = datetime.now().strftime('%H:%M:%S')
+        self.recent_logs.extend(f"[{ts}] {t}" for t in batch[-self.recent_logs.maxlen:])
+
+    def on_progress(self, p):
+        """状态栏显示后台操作进度；操作结束后 3 秒清除"""
+        name = KIND_NAMES.get(p["kind"], p["kind"])
+        if p["finished"]:
+            self.statusBar().showMessage(f"{name}结束：{p['done']}/{p['total']}，用时 {p['elapsed']:.1f}s", 3000)
+            return
+        text = f"{name}中：{p['done']}/{p['total']} · {p['rate']:.0f} 个/s"
+        if p["bytes"]: text += f" · {p['bytes_rate'] / 1048576:.1f} MB/s"
+        if p["eta"] is not None: text += f" · 剩余约 {p['eta']:.0f}s"
+        self.statusBar().showMessage(text)
+
     def show_logs(self):
         d = QDialog(self); d.setWindowTitle("运行日志"); d.resize(800, 600)
         d.setStyleSheet("""
@@ -658,15 +448,41 @@ class EStarApp(QMainWindow):
         """)
         l = QVBoxLayout(d); t = QTextEdit(); t.setReadOnly(True)
         t.setPlainText("\n".join(self.recent_logs))
-        l.addWidget(t)
+        l.addWidget(t, 3)
+        # 运行统计：最近一次在最上面
+        s = QTextEdit(); s.setReadOnly(True)
+        s.setPlainText("\n\n".join(st.summary() for st in reversed(self.recent_stats)) or "暂无运行统计")
+        l.addWidget(s, 2)
+        row = QHBoxLayout()
+        prof = QCheckBox("之后的操作启用性能分析（cProfile）")
+        prof.setChecked(self.core.profile is not None)
+        prof.toggled.connect(lambda on: setattr(self.core, "profile", "" if on else None))
+        row.addWidget(prof); row.addStretch()
+        e = QPushButton("导出统计 JSON"); e.setCursor(Qt.PointingHandCursor)
+        e.setEnabled(bool(self.recent_stats)); e.clicked.connect(lambda: self.export_stats(d))
+        row.addWidget(e)
         b = QPushButton("打开日志文件"); b.setCursor(Qt.PointingHandCursor)
         b.clicked.connect(lambda: os.startfile(self.current_log_file)
                           if os.path.exists(self.current_log_file) else None)
-        l.addWidget(b); d.exec()
+        row.addWidget(b); l.addLayout(row); d.exec()
+
+    def on_stats_ready(self, st):
+        self.recent_stats.append(st)
+        logging.info(st.summary())
+
+    def export_stats(self, parent):
+        path, _ = QFileDialog.getSaveFileName(parent, "导出运行统计", f"md_stats_{datetime.now():%Y%m%d_%H%M%S}.json",
+                                              "JSON (*.json)")
+        if not path: return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump([st.to_dict() for st in self.recent_stats], f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            QMessageBox.warning(parent, "提示", f"导出失败：{e}")
 
     # ── 改进2：统一忙碌态管理 ──────────────────────────────────────────────
     def set_busy(self, busy: bool, btn, busy_text="处理中…", idle_text=None):
-        self._busy = busy
+        self._busy = busy or bool(self._busy_tasks)
         btn.setEnabled(not busy)
         if busy:
             btn._idle_text = btn.text()
@@ -704,6 +520,9 @@ class EStarApp(QMainWindow):
         log_btn.setIcon(GeoIcon.get("log", "#888"))
         log_btn.setStyleSheet("border:none; color:#888; font-weight:bold; margin-bottom:20px; background:transparent;")
         log_btn.setCursor(Qt.PointingHandCursor); log_btn.clicked.connect(self.show_logs)
+        self.lbl_tasks = QLabel("")
+        self.lbl_tasks.setStyleSheet("color:#AAA; font-size:12px; border:none;")
+        l.addWidget(self.lbl_tasks, alignment=Qt.AlignCenter)
         l.addWidget(log_btn, alignment=Qt.AlignCenter)
         self.stack.addWidget(p)
 
@@ -781,7 +600,15 @@ class EStarApp(QMainWindow):
         self.b_clean.setEnabled(False)
         self.b_clean.clicked.connect(self.do_clean_check)
 
+        # 多进程审计（1 = 串行）
+        self.audit_jobs = QSpinBox(); self.audit_jobs.setPrefix("并行进程: ")
+        self.audit_jobs.setRange(1, os.cpu_count() or 1); self.audit_jobs.setValue(1)
+
+        self.audit_cache = QCheckBox("增量缓存")
+        self.audit_cache.setToolTip("在扫描目录保存缓存，再次扫描时只解析有变化的文件")
+
         btns.addWidget(self.b_audit); btns.addWidget(self.b_clean); btns.addStretch()
+        btns.addWidget(self.audit_cache); btns.addWidget(self.audit_jobs)
         l.addLayout(btns)
 
     def start_audit(self):
@@ -791,7 +618,8 @@ class EStarApp(QMainWindow):
             return
         self.audit_path.mark_error(False)
         self.set_busy(True, self.b_audit, "扫描中…")
-        threading.Thread(target=self.core.analyze_path_entry, args=(path,), daemon=True).start()
+        jobs, cache = self.audit_jobs.value(), self.audit_cache.isChecked()
+        self.run_task("审计", lambda c: c.analyze_path_entry(path, jobs, cache), btn=self.b_audit)
 
     # ── 2. 迁移页 ──────────────────────────────────────────────────────────
     def ui_migrate_content(self, l):
@@ -802,10 +630,24 @@ class EStarApp(QMainWindow):
         self.mig_opts = {
             'm': QCheckBox("合并为一个文档"), 's': QCheckBox("图片存入子文件夹"),
             'd': QCheckBox("下载远程图片"),   'c': QCheckBox("完成后清理"),
+            'k': QCheckBox("启用下载缓存"),
         }
         self.mig_opts['s'].setChecked(True); self.mig_opts['d'].setChecked(True)
         opts.addWidget(self.mig_opts['m'], 0, 0); opts.addWidget(self.mig_opts['s'], 0, 1)
         opts.addWidget(self.mig_opts['d'], 1, 0); opts.addWidget(self.mig_opts['c'], 1, 1)
+
+        # 下载并发：线程池大小 / 单主机连接上限
+        h_dl = QHBoxLayout(); h_dl.setSpacing(10)
+        self.mig_workers = QSpinBox(); self.mig_workers.setPrefix("下载并发: ")
+        self.mig_workers.setRange(1, 64); self.mig_workers.setValue(DOWNLOAD_WORKERS)
+        self.mig_per_host = QSpinBox(); self.mig_per_host.setPrefix("单主机: ")
+        self.mig_per_host.setRange(1, 16); self.mig_per_host.setValue(DOWNLOAD_PER_HOST)
+        self.mig_max_mb = QSpinBox(); self.mig_max_mb.setPrefix("大小上限: "); self.mig_max_mb.setSuffix(" MB")
+        self.mig_max_mb.setRange(1, 4096); self.mig_max_mb.setValue(DOWNLOAD_MAX_MB)
+        h_dl.addWidget(self.mig_workers); h_dl.addWidget(self.mig_per_host); h_dl.addWidget(self.mig_max_mb)
+        h_dl.addStretch()
+        opts.addWidget(self.mig_opts['k'], 2, 0)
+        opts.addLayout(h_dl, 3, 0, 1, 2)
         l.addLayout(opts); l.addStretch()
 
         btns = QHBoxLayout(); btns.setSpacing(15)
@@ -816,7 +658,7 @@ class EStarApp(QMainWindow):
         self.b_mig_cancel = QPushButton("取消")
         self.b_mig_cancel.setProperty("class", "CancelBtn")
         self.b_mig_cancel.setVisible(False)
-        self.b_mig_cancel.clicked.connect(self.core.cancel)
+        self.b_mig_cancel.clicked.connect(lambda: self.scheduler.cancel(self._mig_task))
 
         btns.addStretch(); btns.addWidget(self.b_mig_cancel); btns.addWidget(self.b_mig)
         l.addLayout(btns)
@@ -842,12 +684,23 @@ class EStarApp(QMainWindow):
         h_pat.addWidget(self.ren_pad)
         l.addLayout(h_pat)
 
+        # 同步更新其他笔记中指向被重命名文件的链接
+        h_link = QHBoxLayout()
+        self.ren_relink = QCheckBox("同步更新链接")
+        self.ren_relink.setToolTip("改写笔记库内所有 [文字](旧名.md) 形式的链接")
+        self.ren_vault = QLineEdit(); self.ren_vault.setPlaceholderText("笔记库根目录（留空 = 目标文件夹）")
+        h_link.addWidget(self.ren_relink); h_link.addWidget(self.ren_vault)
+        l.addLayout(h_link)
+
         for w in [self.ren_path, self.ren_pat, self.ren_start, self.ren_pad]:
             if isinstance(w, QLineEdit): w.textChanged.connect(self.trigger_preview)
             else: w.valueChanged.connect(self.trigger_preview)
 
         l.addSpacing(10)
-        self.ren_view = QTextEdit(); self.ren_view.setFixedHeight(100); self.ren_view.setReadOnly(True)
+        # 虚拟化列表：两万个文件也只渲染可见的几行
+        self.ren_model = RenamePreviewModel(self)
+        self.ren_view = QListView(); self.ren_view.setFixedHeight(100)
+        self.ren_view.setUniformItemSizes(True); self.ren_view.setModel(self.ren_model)
         l.addWidget(self.ren_view)
 
         # 改进4：文件数提示
@@ -863,7 +716,7 @@ class EStarApp(QMainWindow):
 
         self.b_undo = QPushButton("撤销")
         self.b_undo.setProperty("class", "GhostBtn"); self.b_undo.setEnabled(False)
-        self.b_undo.clicked.connect(self.do_undo_rename)
+        self.b_undo.clicked.connect(lambda: self.do_undo_rename(self.b_undo))
 
         h_act.addWidget(self.b_rename); h_act.addWidget(self.b_undo); h_act.addStretch()
         l.addLayout(h_act)
@@ -897,10 +750,27 @@ class EStarApp(QMainWindow):
         self.b_inp_cancel = QPushButton("取消")
         self.b_inp_cancel.setProperty("class", "CancelBtn"); self.b_inp_cancel.setFixedWidth(100)
         self.b_inp_cancel.setVisible(False)
-        self.b_inp_cancel.clicked.connect(self.core.cancel)
+        # 监视与单次整理可同时进行：先取消单次整理，再次点击结束监视
+        self.b_inp_cancel.clicked.connect(lambda: self.scheduler.cancel(self._inp_task or self._watch_task))
+
+        # 监视模式：持续整理，取消按钮结束监视
+        self.b_inp_watch = QPushButton("持续监视")
+        self.b_inp_watch.setProperty("class", "GhostBtn"); self.b_inp_watch.setFixedWidth(150)
+        self.b_inp_watch.setToolTip("监视文件夹，新粘贴的图片与修改过的文档自动整理")
+        self.b_inp_watch.clicked.connect(self.start_inp_watch)
 
-        h.addWidget(self.b_inp_only); h.addWidget(self.b_inp_clean); h.addWidget(self.b_inp_cancel)
-        l.addLayout(h); l.addStretch()
+        # 撤销历史与重命名页共用，撤销的总是最近一批操作
+        self.b_inp_undo = QPushButton("撤销")
+        self.b_inp_undo.setProperty("class", "GhostBtn"); self.b_inp_undo.setEnabled(False)
+        self.b_inp_undo.clicked.connect(lambda: self.do_undo_rename(self.b_inp_undo))
+
+        h.addWidget(self.b_inp_only); h.addWidget(self.b_inp_clean); h.addWidget(self.b_inp_watch)
+        h.addWidget(self.b_inp_undo); h.addWidget(self.b_inp_cancel)
+        l.addLayout(h)
+
+        self.inp_recursive = QCheckBox("包含所有子文件夹（各自归档到自己的 ./images）")
+        hr = QHBoxLayout(); hr.setAlignment(Qt.AlignCenter); hr.addWidget(self.inp_recursive)
+        l.addSpacing(20); l.addLayout(hr); l.addStretch()
 
     # ── 逻辑回调 ───────────────────────────────────────────────────────────
     def on_info_ready(self, d):
@@ -935,16 +805,39 @@ class EStarApp(QMainWindow):
         btn_delete = msg.addButton("直接永久删除",      QMessageBox.ActionRole)
         msg.addButton("取消", QMessageBox.RejectRole)
         msg.exec()
-        if msg.clickedButton() == btn_backup:
-            self.b_clean.setEnabled(False)
-            threading.Thread(target=self._do_clean_and_rescan, args=(False,), daemon=True).start()
-        elif msg.clickedButton() == btn_delete:
+        if msg.clickedButton() in (btn_backup, btn_delete):
             self.b_clean.setEnabled(False)
-            threading.Thread(target=self._do_clean_and_rescan, args=(True,), daemon=True).start()
+            files, forever = list(self.red_list), msg.clickedButton() == btn_delete
+            path, jobs, cache = self.audit_path.text(), self.audit_jobs.value(), self.audit_cache.isChecked()
+            self.run_task("清理", lambda c: self._do_clean_and_rescan(c, files, forever, path, jobs, cache),
+                          exclusive=True)
 
-    def _do_clean_and_rescan(self, forever):
-        self.core.cleanup_files(self.red_list, forever)
-        self.core.analyze_path_entry(self.audit_path.text())
+    @staticmethod
+    def _do_clean_and_rescan(core, files, forever, path, jobs, cache):
+        core.cleanup_files(files, forever)
+        core.analyze_path_entry(path, jobs, cache)
+
+    def check_journal(self, root):
+        """root 中有上次中断留下的操作日志时，先让用户选择回滚或补做；返回 False 表示放弃本次操作"""
+        try:
+            kind = pending(root)
+        except JournalPending as e:   # 日志属于仍在进行的操作，不能当作中断处理
+            QMessageBox.warning(self, "提示", str(e)); return False
+        if kind is None: return True
+        msg = QMessageBox(self)
+        msg.setWindowTitle("发现未完成的操作")
+        msg.setText(f"该目录上次的操作（{kind}）没有正常结束。\n请先选择如何处理：")
+        btn_undo = msg.addButton("回滚到操作前 (推荐)", QMessageBox.ActionRole)
+        btn_redo = msg.addButton("补做剩余步骤",        QMessageBox.ActionRole)
+        msg.addButton("取消", QMessageBox.RejectRole)
+        msg.exec()
+        if msg.clickedButton() not in (btn_undo, btn_redo): return False
+        try:
+            _, n = recover(root, msg.clickedButton() == btn_redo, self.append_log)
+        except Exception as e:
+            QMessageBox.warning(self, "提示", f"恢复失败：{e}"); return False
+        self.append_log(f"[日志] 已处理上次中断的操作，共 {n} 项")
+        return True
 
     def start_mig(self):
         # 改进7：迁移前路径即时校验
@@ -965,24 +858,32 @@ class EStarApp(QMainWindow):
         c['subfolder'] = self.mig_opts['s'].isChecked()
         c['merge'] = self.mig_opts['m'].isChecked()
         c['cleanup'] = self.mig_opts['c'].isChecked()
+        c['download_workers'] = self.mig_workers.value()
+        c['download_per_host'] = self.mig_per_host.value()
+        c['download_max_mb'] = self.mig_max_mb.value()
+        c['download_cache'] = os.path.join(dst, DOWNLOAD_CACHE_NAME) if self.mig_opts['k'].isChecked() else None
 
         os.makedirs(dst, exist_ok=True)
+        if not self.check_journal(dst): return
         self.set_busy(True, self.b_mig, "迁移中…")
         self.b_mig_cancel.setVisible(True)   # 改进9
-        threading.Thread(target=self.core.process_migration, args=(src, dst, c), daemon=True).start()
+        self._mig_task = self.run_task("迁移", lambda core: core.process_migration(src, dst, c), exclusive=True,
+                                       btn=self.b_mig, cancel=self.b_mig_cancel)
 
     def trigger_preview(self):
         self._preview_timer.start()
 
     def _do_trigger_preview(self):
-        threading.Thread(
-            target=self.core.generate_rename_preview,
-            args=(self.ren_path.text(), self.ren_pat.text(), self.ren_start.value(), self.ren_pad.value()),
-            daemon=True
-        ).start()
+        # 预览为低优先级任务；同 key 合并，排队中的旧请求直接丢弃。用主引擎以复用目录列表缓存
+        self._preview_gen += 1
+        args = (self.ren_path.text(), self.ren_pat.text(), self.ren_start.value(), self.ren_pad.value())
+        gen = self._preview_gen
+        self.run_task("预览", lambda c, tok: c.generate_rename_preview(*args, cancel=tok, gen=gen),
+                      priority=PRIORITY_PREVIEW, key="preview", fork=False)
 
-    def on_ren_preview(self, t):
-        self.ren_view.setPlainText(t)
+    def on_ren_preview(self, plan):
+        if plan.gen != self._preview_gen: return   # 较早的请求晚到的结果
+        self.ren_model.set_plan(plan)
 
     def on_ren_count(self, n):
         """改进4：更新重命名文件数提示"""
@@ -997,38 +898,41 @@ class EStarApp(QMainWindow):
             self.ren_path.mark_error(True); return
         self.ren_path.mark_error(False)
         self.set_busy(True, self.b_rename, "重命名中…")
-        threading.Thread(
-            target=self.core.execute_rename_batch,
-            args=(path, self.ren_pat.text(), self.ren_start.value(), self.ren_pad.value()),
-            daemon=True
-        ).start()
+        args = (path, self.ren_pat.text(), self.ren_start.value(), self.ren_pad.value(),
+                (self.ren_vault.text().strip() or path) if self.ren_relink.isChecked() else None)
+        self.run_task("重命名", lambda c: c.execute_rename_batch(*args), exclusive=True, btn=self.b_rename)
 
-    def do_undo_rename(self):
-        self.set_busy(True, self.b_undo, "撤销中…")
-        threading.Thread(target=self.core.undo_last_rename, daemon=True).start()
+    def do_undo_rename(self, btn):
+        """btn 为被点击的撤销按钮；两页共用撤销历史，撤销结束前两个按钮都不可用"""
+        self.set_busy(True, btn, "撤销中…")
+        for b in (self.b_undo, self.b_inp_undo): b.setEnabled(False)
+        self._undo_task = self.run_task("撤销", lambda c: c.undo_last(), exclusive=True, btn=btn)
 
     def on_undo_state_change(self, steps: int):
-        """改进8：显示可撤销步数"""
-        if steps > 0:
-            self.b_undo.setEnabled(True)
-            self.b_undo.setText(f"撤销（共 {steps} 步）")
-        else:
-            self.b_undo.setEnabled(False)
-            self.b_undo.setText("撤销")
+        """改进8：显示可撤销步数（重命名页与原地整理页共用一个撤销历史）；撤销进行中时等它结束再更新"""
+        if self._undo_task is not None: return
+        last = self.core.history.peek() if steps > 0 else None
+        tip = f"将撤销最近一次{'重命名' if last['k'] == 'rename' else '原地整理'}：{last['root']}" if last else ""
+        for btn in (self.b_undo, self.b_inp_undo):
+            btn.setEnabled(steps > 0)
+            btn.setText(f"撤销（共 {steps} 步）" if steps > 0 else "撤销")
+            btn.setToolTip(tip)
 
     def start_inp(self, cln):
         p = QFileDialog.getExistingDirectory(self, "选目录")
-        if not p: return
+        if not p or not self.check_journal(p): return
 
         # 改进3：扫描后给出确认信息
-        md_cnt, img_cnt = self.core.scan_inplace_preview(p)
+        rec = self.inp_recursive.isChecked()
+        plan = self.core.plan_inplace(p, rec)   # 确认后直接执行这份计划，不再重复扫描
+        md_cnt, img_cnt = plan.md_cnt, plan.img_cnt
         if md_cnt == 0:
             QMessageBox.warning(self, "提示", "所选目录中没有找到 MD 文件。"); return
 
         msg = QMessageBox(self)
         msg.setWindowTitle("整理确认")
         msg.setText(
-            f"即将整理 <b>{md_cnt}</b> 个 MD 文件，"
+            f"即将整理{'（含子文件夹）' if rec else ''} <b>{md_cnt}</b> 个 MD 文件，"
             f"移动 <b>{img_cnt}</b> 张图片至 ./images/。\n\n"
             f"{'同时清理未被引用的图片。' if cln else '仅整理，不删除多余图片。'}\n\n"
             "此操作会移动文件，确认继续吗？"
@@ -1037,29 +941,37 @@ class EStarApp(QMainWindow):
         msg.setDefaultButton(QMessageBox.Cancel)
         if msg.exec() != QMessageBox.Ok: return
 
-        self.set_busy(True, self.b_inp_clean if cln else self.b_inp_only, "整理中…")
+        btn = self.b_inp_clean if cln else self.b_inp_only
+        self.set_busy(True, btn, "整理中…")
         self.b_inp_cancel.setVisible(True)   # 改进9
-        threading.Thread(target=self.core.process_inplace, args=(p, cln), daemon=True).start()
+        self._inp_task = self.run_task("原地整理", lambda c: c.process_inplace(p, cln, rec, INPLACE_WORKERS, plan),
+                                       exclusive=True, btn=btn, cancel=self.b_inp_cancel)
+
+    def start_inp_watch(self):
+        p = QFileDialog.getExistingDirectory(self, "选择要监视的目录")
+        if not p or not self.check_journal(p): return
+        self.set_busy(True, self.b_inp_watch, "监视中…")
+        self.b_inp_cancel.setVisible(True)
+        # 监视大部分时间在等待，不占用独占名额，避免挡住其他整理/迁移
+        self._watch_task = self.run_task("持续监视", lambda c: c.watch_inplace(p),
+                                         btn=self.b_inp_watch, cancel=self.b_inp_cancel)
+
+    def _restore_task_buttons(self, task):
+        """改进2：任务结束时只恢复该任务自己的按钮；同页还有别的任务在运行时取消按钮继续显示"""
+        btn, cancel = self._busy_tasks.pop(task, (None, None))
+        if task is self._undo_task: self._undo_task = None
+        if btn in (self.b_undo, self.b_inp_undo):
+            self.on_undo_state_change(len(self.core.history))   # undo 文字与可用状态由撤销历史决定
+        elif btn is not None:
+            self.set_busy(False, btn)
+        if cancel is not None and not any(c is cancel for _, c in self._busy_tasks.values()):
+            cancel.setVisible(False)
+        if task is self._mig_task: self._mig_task = None
+        if task is self._inp_task: self._inp_task = None
+        if task is self._watch_task: self._watch_task = None
+        self._busy = bool(self._busy_tasks)
 
     def on_task_done(self, ok, msg):
-        # 改进2：所有任务完成时恢复按钮
-        for btn, idle in [
-            (self.b_mig,    "执行迁移"),
-            (self.b_rename, "执行重命名"),
-            (self.b_undo,   None),           # undo 文字由 on_undo_state_change 控制
-            (self.b_inp_only,  "仅整理"),
-            (self.b_inp_clean, "整理并清理"),
-            (self.b_audit,  "开始扫描"),
-        ]:
-            if not btn.isEnabled():
-                btn.setEnabled(True)
-                if idle: btn.setText(idle)
-
-        # 隐藏取消按钮
-        self.b_mig_cancel.setVisible(False)
-        self.b_inp_cancel.setVisible(False)
-        self._busy = False
-
         if ok: QMessageBox.information(self, "完成", msg)
         else:  QMessageBox.warning(self, "提示", msg)
 
@@ -1070,6 +982,7 @@ class EStarApp(QMainWindow):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()   # 打包后多进程审计需要
     app = QApplication(sys.argv)
     win = EStarApp()
     win.show()
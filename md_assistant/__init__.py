@@ -0,0 +1,34 @@
+"""Markdown 小助手引擎包：不依赖 Qt 的业务逻辑与命令行入口。
+
+顶层名称按需导入（PEP 562），``import md_assistant`` 本身不加载任何子模块。
+"""
+import importlib
+
+_EXPORTS = {
+    "MarkdownLogicCore": ".core",
+    "InplacePlan":       ".core",
+    "RenamePreview":     ".core",
+    "ImageTreeIndex":    ".index",
+    "LocalBlobIndex":    ".index",
+    "ImageRef":          ".refs",
+    "image_refs":        ".refs",
+    "RemoteFetcher":     ".fetch",
+    "DownloadCache":     ".fetch",
+    "Signal":            ".events",
+    "TaskScheduler":     ".scheduler",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    mod = _EXPORTS.get(name)
+    if mod is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(mod, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,231 @@
+"""基准测试：生成合成笔记库，无界面地计时审计、迁移、原地整理、重命名四个操作。
+
+    python -m md_assistant.bench --notes 500 --images 4 --remote 0.1 --latency 0.05 -o result.json
+    python -m md_assistant.bench --baseline result.json --threshold 1.2     # 任一操作变慢超过 20% 时退出码为 1
+    python -m md_assistant.bench --ops parse --code 0.3                     # 只计时图片引用解析，与旧正则对照
+
+远程图片由本机的 HTTP 替身服务（ImageServer）提供，每个请求按 --latency 延迟后返回，不访问外网。
+同样的参数与 --seed 生成完全相同的笔记库；每个操作每轮都在笔记库的新副本上运行，互不影响。
+结果以 JSON 输出到 stdout（同时可用 -o 保存），可直接作为下次运行的 --baseline。
+"""
+import argparse
+import http.server
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from . import refs
+from .core import MarkdownLogicCore
+
+OPS = ("audit", "migrate", "inplace", "rename", "parse")
+EXIT_OK, EXIT_REGRESSED = 0, 1
+
+_PNG = b"\x89PNG\r\n\x1a\n"   # 只需文件头，工具不解码图片
+_WORDS = ("markdown", "图片", "迁移", "note", "链接", "vault", "整理", "资源", "path", "文档")
+_LEGACY_IMAGE = re.compile(r'!\[.*?\]\((.*?)\)')   # 引入 refs 之前的图片正则，作为解析速度的对照
+
+
+class ImageServer:
+    """本机 HTTP 替身：任意路径都返回一张按路径确定内容的 PNG，每个请求先等待 latency 秒"""
+
+    def __init__(self, latency=0.0):
+        lat = latency
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if lat: time.sleep(lat)
+                body = _PNG + self.path.encode() * 64
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *a): pass
+
+        self._srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._srv.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._srv.server_address[1]}"
+        self._th = threading.Thread(target=self._srv.serve_forever, name="md-bench-http", daemon=True)
+
+    def __enter__(self):
+        self._th.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._srv.shutdown(); self._srv.server_close()
+
+
+def make_vault(root, notes=200, depth=2, images=4, dup=0.2, remote=0.1, code=0.0, base_url="http://127.0.0.1", seed=0):
+    """在 root 下生成合成笔记库，返回 {"dirs", "notes", "images", "remote"} 计数。
+
+    目录为深 depth 层的二叉树，笔记轮流分到各目录；每篇 images 个图片引用，其中 remote 比例指向 base_url，
+    其余为笔记旁边的本地图片，本地图片中 dup 比例与之前某张内容相同（测试内容去重）。
+    code 为段落含行内代码、笔记末尾含代码块示例的比例；代码块中的图片写法不应被当作引用。
+    每篇笔记还有一个指向另一篇笔记的 [文字](相对路径.md) 链接（测试重命名同步链接）。
+    """
+    rnd = random.Random(seed)
+    dirs, level = [root], [root]
+    for lv in range(depth):
+        level = [os.path.join(d, f"d{lv}_{k}") for d in level for k in range(2)]
+        dirs += level
+    for d in dirs: os.makedirs(d, exist_ok=True)
+    paths = [os.path.join(dirs[i % len(dirs)], f"note_{i:05d}.md") for i in range(notes)]
+    blobs, n_img, n_remote = [], 0, 0
+    for i, p in enumerate(paths):
+        d = os.path.dirname(p)
+        lines = [f"# Note {i}", ""]
+        for j in range(images):
+            words = [rnd.choice(_WORDS) for _ in range(rnd.randint(20, 60))]
+            if code and rnd.random() < code:
+                words[rnd.randrange(len(words))] = f"`{rnd.choice(_WORDS)}`"
+            lines.append(" ".join(words))
+            if rnd.random() < remote:
+                lines.append(f"![r{j}]({base_url}/img/{i}_{j}.png)"); n_remote += 1
+                continue
+            name = f"img_{i:05d}_{j}.png"
+            data = rnd.choice(blobs) if blobs and rnd.random() < dup else _PNG + f"{seed}/{i}/{j}".encode() * 256
+            blobs.append(data)
+            with open(os.path.join(d, name), "wb") as f: f.write(data)
+            lines.append(f"![i{j}]({name})"); n_img += 1
+        if notes > 1:
+            other = paths[rnd.randrange(notes)]
+            lines.append(f"\n另见 [{os.path.basename(other)}]({os.path.relpath(other, d).replace(os.sep, '/')})")
+        if code and rnd.random() < code:
+            lines.append("```markdown\n![示例](example.png)\n```")
+        with open(p, "w", encoding="utf-8") as f: f.write("\n\n".join(lines) + "\n")
+    return {"dirs": len(dirs), "notes": notes, "images": n_img, "remote": n_remote}
+
+
+def _run_op(op, vault, work, jobs):
+    """在 vault 的新副本上执行一次 op，返回 (耗时秒, 是否成功, 结束消息)"""
+    src = os.path.join(work, "vault")
+    shutil.copytree(vault, src)
+    core = MarkdownLogicCore(undo_path=None)
+    done = {}
+    core.task_finished.connect(lambda ok, msg: done.update(ok=ok, msg=msg))
+    core.info_ready.connect(lambda d: done.update(ok=True, msg=f"{d.get('red_cnt', 0)} 张冗余"))
+    t = time.perf_counter()
+    if op == "audit":
+        core.analyze_path_entry(src, jobs)
+    elif op == "migrate":
+        core.process_migration(src, os.path.join(work, "out"),
+                               {'merge': False, 'subfolder': True, 'download': True, 'cleanup': False})
+    elif op == "inplace":
+        core.process_inplace(src, False, True)
+    else:
+        core.execute_rename_batch(src, "{original}_{num}", 1, 3, src)
+    elapsed = time.perf_counter() - t
+    shutil.rmtree(work)
+    return elapsed, done.get("ok", False), done.get("msg", "")
+
+
+def _time_parse(vault, repeat):
+    """在 vault 的全部笔记上计时图片引用解析：中位数为 refs.image_paths，另列 image_refs 与旧正则的结果"""
+    texts = []
+    for d, _, files in os.walk(vault):
+        for name in files:
+            if name.endswith(".md"):
+                with open(os.path.join(d, name), "r", encoding="utf-8") as f: texts.append(f.read())
+    times = {}
+    for name, fn in (("image_paths", refs.image_paths), ("image_refs", refs.image_refs), ("regex", _LEGACY_IMAGE.findall)):
+        runs = []
+        for _ in range(repeat):
+            t = time.perf_counter()
+            for s in texts: fn(s)
+            runs.append(time.perf_counter() - t)
+        times[name] = runs
+    r = {"median": round(statistics.median(times["image_paths"]), 5), "min": round(min(times["image_paths"]), 5),
+         "runs": [round(t, 5) for t in times["image_paths"]], "ok": True}
+    for name in ("image_refs", "regex"): r[name] = round(statistics.median(times[name]), 5)
+    r["message"] = f"{len(texts)} 篇 {sum(map(len, texts))} 字符，image_paths 为旧正则的 {r['median'] / r['regex']:.2f} 倍"
+    return r
+
+
+def run(params, ops=OPS, repeat=3, jobs=1, latency=0.0):
+    """生成笔记库并计时各操作，返回结果字典（即 JSON 输出的内容）"""
+    tmp = tempfile.mkdtemp(prefix="md_bench_")
+    try:
+        with ImageServer(latency) as srv:
+            vault = os.path.join(tmp, "template")
+            counts = make_vault(vault, base_url=srv.url, **params)
+            results = {}
+            for op in ops:
+                if op == "parse":
+                    results[op] = _time_parse(vault, max(repeat, 5))
+                    continue
+                runs, ok, msg = [], True, ""
+                for _ in range(repeat):
+                    t, good, msg = _run_op(op, vault, os.path.join(tmp, "work"), jobs)
+                    runs.append(round(t, 4)); ok = ok and good
+                results[op] = {"median": round(statistics.median(runs), 4), "min": min(runs),
+                               "runs": runs, "ok": ok, "message": msg}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return {
+        "env": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "params": {**params, "repeat": repeat, "jobs": jobs, "latency": latency},
+        "vault": counts,
+        "results": results,
+    }
+
+
+def compare(result, baseline, threshold=1.2):
+    """按中位数与基线对比，返回 {操作: {"baseline", "ratio", "regressed"}}；基线中没有的操作不比较"""
+    out = {}
+    for op, r in result["results"].items():
+        b = baseline.get("results", {}).get(op)
+        if not b or not b.get("median"): continue
+        ratio = r["median"] / b["median"]
+        out[op] = {"baseline": b["median"], "ratio": round(ratio, 3), "regressed": ratio > threshold}
+    if baseline.get("params") != result["params"]:
+        out["warning"] = "基线的参数与本次不同，对比仅供参考"
+    return out
+
+
+def build_parser():
+    p = argparse.ArgumentParser(prog="md_assistant.bench", description="Markdown 小助手基准测试")
+    p.add_argument("--notes", type=int, default=200, help="笔记数")
+    p.add_argument("--depth", type=int, default=2, help="目录嵌套层数")
+    p.add_argument("--images", type=int, default=4, help="每篇笔记的图片引用数")
+    p.add_argument("--dup", type=float, default=0.2, help="本地图片中内容重复的比例")
+    p.add_argument("--remote", type=float, default=0.1, help="图片引用中远程 URL 的比例")
+    p.add_argument("--code", type=float, default=0.0, help="含行内代码与代码块的比例")
+    p.add_argument("--latency", type=float, default=0.0, help="HTTP 替身每个请求的延迟（秒）")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--ops", nargs="+", choices=OPS, default=list(OPS), help="要计时的操作")
+    p.add_argument("-n", "--repeat", type=int, default=3, help="每个操作运行的轮数，取中位数")
+    p.add_argument("-j", "--jobs", type=int, default=1, help="审计的并行进程数")
+    p.add_argument("-o", "--output", help="结果另存为 JSON 文件")
+    p.add_argument("--baseline", help="与之前保存的结果对比")
+    p.add_argument("--threshold", type=float, default=1.2, help="中位数超过基线的多少倍算作退化")
+    return p
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    params = {k: getattr(args, k) for k in ("notes", "depth", "images", "dup", "remote", "code", "seed")}
+    result = run(params, args.ops, max(1, args.repeat), args.jobs, args.latency)
+    code = EXIT_OK
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            result["compare"] = compare(result, json.load(f), args.threshold)
+        if any(isinstance(c, dict) and c["regressed"] for c in result["compare"].values()):
+            code = EXIT_REGRESSED
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: f.write(text + "\n")
+    sys.stdout.write(text + "\n")
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""日志与进度通道：工作线程只把消息放进内存缓冲，由后台线程按固定频率成批发出。
+
+- 日志每 LOG_FLUSH_INTERVAL 秒合并为一批 on_batch([消息, ...])，同时逐条写入 logger；
+  GUI 每批只收到一次跨线程信号，写日志文件的磁盘开销也不落在工作线程上。
+- 进度（已完成 / 总数、字节数、速率、预计剩余时间）按同样的频率、只在有变化时发出 on_progress(dict)。
+- 后台线程在有消息时才启动，空闲一段时间后自动退出；flush() 立即在调用线程中发出缓冲内容，
+  操作结束、命令行输出结果前调用，保证日志完整且顺序不乱。
+"""
+import time
+import threading
+
+LOG_FLUSH_INTERVAL = 0.1   # 日志与进度的发出间隔（秒）
+_IDLE_EXIT = 2.0           # 后台线程无事可做多少秒后退出
+
+
+class LogChannel:
+    """on_batch(list[str]) / on_progress(dict) 在后台线程或 flush() 的调用线程中被调用；
+    read_bytes() 返回当前已读取的字节数，用于计算进度中的字节与速率"""
+
+    def __init__(self, on_batch, on_progress, logger=None, read_bytes=None, interval=LOG_FLUSH_INTERVAL):
+        self._on_batch, self._on_progress = on_batch, on_progress
+        self._logger = logger
+        self._read_bytes = read_bytes or (lambda: 0)
+        self.interval = interval
+        self._buf = []
+        self._prog = None    # [类型, 已完成, 总数, 开始时间, 是否已结束]
+        self._dirty = False  # 进度自上次发出后有变化
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()   # 后台线程与 flush() 不交错发出
+        self._thread = None
+
+    # --- 工作线程调用：只加锁改内存 ---
+    def log(self, msg):
+        with self._lock:
+            self._buf.append(msg)
+            if self._thread is None: self._start()
+
+    def begin(self, kind, total):
+        """开始报告一个操作的进度；total 为要处理的项数"""
+        with self._lock:
+            self._prog = [kind, 0, total, time.monotonic(), False]
+            self._dirty = True
+            if self._thread is None: self._start()
+
+    def advance(self, n=1):
+        with self._lock:
+            if self._prog is None: return
+            self._prog[1] += n
+            self._dirty = True
+
+    def end(self):
+        """结束进度报告（完成、取消或出错）：最后一次进度带 finished=True，由下一次发出时送出"""
+        with self._lock:
+            if self._prog is None: return
+            self._prog[4] = True
+            self._dirty = True
+
+    # --- 发出 ---
+    def _start(self):
+        """调用方持有 _lock"""
+        self._thread = threading.Thread(target=self._run, name="md-log", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        idle = 0.0
+        while True:
+            time.sleep(self.interval)
+            if self._drain(): idle = 0.0; continue
+            idle += self.interval
+            with self._lock:
+                if idle >= _IDLE_EXIT and not self._buf and not self._dirty:
+                    self._thread = None
+                    return
+
+    def flush(self):
+        self._drain()
+
+    def _drain(self):
+        """发出缓冲中的日志与最新进度；有内容发出时返回 True"""
+        with self._emit_lock:
+            with self._lock:
+                batch, self._buf = self._buf, []
+                prog = self._snapshot() if self._dirty else None
+                self._dirty = False
+                if prog is not None and prog["finished"]: self._prog = None
+            if batch:
+                if self._logger:
+                    for m in batch: self._logger.info(m)
+                self._on_batch(batch)
+            if prog is not None: self._on_progress(prog)
+            return bool(batch or prog)
+
+    def _snapshot(self):
+        """调用方持有 _lock"""
+        kind, done, total, t0, finished = self._prog
+        elapsed = max(time.monotonic() - t0, 1e-6)
+        nbytes = self._read_bytes()
+        rate = done / elapsed
+        if finished or done >= total: eta = 0.0
+        else: eta = round((total - done) / rate, 1) if done else None   # 尚无完成项时无法估计
+        return {
+            "kind": kind, "done": done, "total": total, "bytes": nbytes, "elapsed": round(elapsed, 2),
+            "rate": round(rate, 1), "bytes_rate": round(nbytes / elapsed), "eta": eta, "finished": finished,
+        }
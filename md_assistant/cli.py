@@ -0,0 +1,204 @@
+"""命令行入口：python -m md_assistant {audit,migrate,inplace,rename,undo,recover} ...
+
+不导入 PySide6，可在 cron / CI / 无界面服务器上运行。
+结果以 JSON 输出到 stdout，进度日志写到 stderr。
+退出码：0 成功；1 任务失败；2 参数错误；3 指定 --fail-on-unused 且存在冗余图片；130 被中断。
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+
+from .core import MarkdownLogicCore, INPLACE_WORKERS
+from .index import AUDIT_CACHE_NAME
+from .watch import WATCH_DEBOUNCE
+from .journal import JOURNAL_DIR
+from .fetch import DOWNLOAD_WORKERS, DOWNLOAD_PER_HOST, DOWNLOAD_MAX_MB, DOWNLOAD_CACHE_NAME
+
+EXIT_OK, EXIT_FAIL, EXIT_UNUSED, EXIT_INTERRUPTED = 0, 1, 3, 130   # 2 由 argparse 负责
+
+
+class _Collector:
+    """收集引擎事件，供命令行在任务结束后统一输出"""
+    def __init__(self, core, quiet=False):
+        self.ok, self.message = None, ""
+        self.info, self.unused, self.preview, self.count = None, None, None, 0
+        self.stats = []
+        core.task_finished.connect(self._on_done)
+        core.info_ready.connect(self._on_info)
+        core.scan_finished.connect(self._on_unused)
+        core.rename_preview_ready.connect(self._on_preview)
+        core.rename_count_ready.connect(self._on_count)
+        core.stats_ready.connect(self.stats.append)
+        if not quiet:
+            core.log_batch.connect(lambda b: print("\n".join(b), file=sys.stderr, flush=True))
+            core.stats_ready.connect(lambda st: print(st.summary(), file=sys.stderr, flush=True))
+
+    def _on_done(self, ok, msg): self.ok, self.message = ok, msg
+    def _on_info(self, d): self.info = d
+    def _on_unused(self, u): self.unused = u
+    def _on_preview(self, t): self.preview = t
+    def _on_count(self, n): self.count = n
+
+
+def _install_sigint(core):
+    """第一次 Ctrl+C 通知引擎取消，第二次恢复默认行为直接中断"""
+    def handler(signum, frame):
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        print("收到中断，正在取消…", file=sys.stderr, flush=True)
+        core.cancel()
+    signal.signal(signal.SIGINT, handler)
+
+
+def _clean_unused(core, files, mode, result):
+    if mode in ("backup", "delete") and files:
+        result["cleaned"] = core.cleanup_files(files, mode == "delete")
+
+
+def _cmd_audit(core, col, args):
+    core.analyze_path_entry(args.path, args.jobs, args.cache)
+    if col.info is None:
+        return EXIT_FAIL, {"ok": False, "message": col.message or "审计失败"}
+    result = {"ok": True, **col.info}
+    _clean_unused(core, col.info["red_list"], args.clean, result)
+    if args.fail_on_unused and col.info["red_cnt"] and "cleaned" not in result:
+        return EXIT_UNUSED, result
+    return EXIT_OK, result
+
+
+def _cmd_migrate(core, col, args):
+    os.makedirs(args.dst, exist_ok=True)
+    cfg = {
+        'merge': args.merge, 'subfolder': not args.no_subfolder,
+        'download': not args.no_download, 'cleanup': args.unused is not None,
+        'download_workers': args.workers, 'download_per_host': args.per_host,
+        'download_max_mb': args.max_mb,
+        'download_cache': os.path.join(args.dst, DOWNLOAD_CACHE_NAME) if args.cache else None,
+    }
+    core.process_migration(args.src, args.dst, cfg)
+    return _finish_with_unused(core, col, args)
+
+
+def _cmd_inplace(core, col, args):
+    if not os.path.isdir(args.folder):
+        return EXIT_FAIL, {"ok": False, "message": "无效文件夹"}
+    if args.dry_run:
+        md_cnt, img_cnt = core.scan_inplace_preview(args.folder, args.recursive)
+        return EXIT_OK, {"ok": True, "md_cnt": md_cnt, "img_cnt": img_cnt}
+    if args.watch:
+        # 监视模式以 Ctrl+C 正常结束
+        core.watch_inplace(args.folder, args.debounce, args.poll)
+        core._reset_cancel()
+        return (EXIT_OK if col.ok else EXIT_FAIL), {"ok": bool(col.ok), "message": col.message}
+    core.process_inplace(args.folder, args.unused is not None, args.recursive, args.jobs)
+    return _finish_with_unused(core, col, args)
+
+
+def _finish_with_unused(core, col, args):
+    result = {"ok": bool(col.ok), "message": col.message}
+    if col.unused is not None and args.unused is not None:
+        result["unused"] = col.unused
+        _clean_unused(core, col.unused, args.unused, result)
+    return (EXIT_OK if col.ok else EXIT_FAIL), result
+
+
+def _cmd_rename(core, col, args):
+    if args.dry_run:
+        if not os.path.isdir(args.folder):
+            return EXIT_FAIL, {"ok": False, "message": "无效文件夹"}
+        core.generate_rename_preview(args.folder, args.pattern, args.start, args.pad)
+        return EXIT_OK, {"ok": True, "count": col.count, "preview": col.preview.text() if col.preview else ""}
+    relink = None if args.relink is None else (args.relink or args.folder)
+    core.execute_rename_batch(args.folder, args.pattern, args.start, args.pad, relink)
+    return (EXIT_OK if col.ok else EXIT_FAIL), {"ok": bool(col.ok), "message": col.message}
+
+
+def _cmd_undo(core, col, args):
+    core.undo_last()
+    return (EXIT_OK if col.ok else EXIT_FAIL), {"ok": bool(col.ok), "message": col.message, "remaining": len(core.history)}
+
+
+def _cmd_recover(core, col, args):
+    core.recover_journal(args.folder, args.replay)
+    return (EXIT_OK if col.ok else EXIT_FAIL), {"ok": bool(col.ok), "message": col.message}
+
+
+def build_parser():
+    p = argparse.ArgumentParser(prog="md_assistant", description="Markdown 小助手命令行版")
+    p.add_argument("-q", "--quiet", action="store_true", help="不向 stderr 输出进度日志")
+    p.add_argument("--stats", metavar="FILE", help="把本次各操作的运行统计（计数、分阶段耗时、下载耗时分布）保存为 JSON")
+    p.add_argument("--profile", nargs="?", const="", metavar="FILE",
+                   help="用 cProfile 记录本次运行，热点函数写入统计；给出 FILE 时另存为 .prof")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    a = sub.add_parser("audit", help="资源审计：统计引用与冗余图片")
+    a.add_argument("path", help="MD 文件或文件夹")
+    a.add_argument("--clean", choices=("backup", "delete"), help="清理冗余：移到 unused_backup/ 或永久删除")
+    a.add_argument("--fail-on-unused", action="store_true", help="存在冗余图片时以退出码 3 结束")
+    a.add_argument("-j", "--jobs", type=int, default=1, help="并行解析的进程数（默认 1 = 串行）")
+    a.add_argument("--cache", action="store_true", help=f"增量审计：在扫描根目录维护 {AUDIT_CACHE_NAME}")
+    a.set_defaults(func=_cmd_audit)
+
+    m = sub.add_parser("migrate", help="迁移合并：复制文档并修正图片路径")
+    m.add_argument("src"); m.add_argument("dst")
+    m.add_argument("--merge", action="store_true", help="合并为一个文档")
+    m.add_argument("--no-subfolder", action="store_true", help="图片不按文档分子文件夹")
+    m.add_argument("--no-download", action="store_true", help="不下载远程图片")
+    m.add_argument("--cache", action="store_true", help=f"启用下载缓存（{DOWNLOAD_CACHE_NAME}）")
+    m.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS, help="下载并发数")
+    m.add_argument("--per-host", type=int, default=DOWNLOAD_PER_HOST, help="单主机连接上限")
+    m.add_argument("--max-mb", type=float, default=DOWNLOAD_MAX_MB, help="单个图片大小上限 (MB)")
+    m.add_argument("--unused", choices=("report", "backup", "delete"), help="完成后扫描未引用图片并处理")
+    m.set_defaults(func=_cmd_migrate)
+
+    i = sub.add_parser("inplace", help="原地整理：图片归档到 ./images/ 并修复链接")
+    i.add_argument("folder")
+    i.add_argument("--dry-run", action="store_true", help="只统计将整理的文件与图片数")
+    i.add_argument("-r", "--recursive", action="store_true", help="整理所有子文件夹，各自归档到自己的 ./images/")
+    i.add_argument("-j", "--jobs", type=int, default=INPLACE_WORKERS, help="递归时并行处理的目录数")
+    i.add_argument("--unused", choices=("report", "backup", "delete"), help="完成后扫描未引用图片并处理")
+    i.add_argument("--watch", action="store_true", help="持续监视文件夹，只整理有变化的 MD（Ctrl+C 结束）")
+    i.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE, help="监视模式：变更静默多少秒后处理")
+    i.add_argument("--poll", action="store_true", help="监视模式：强制使用轮询而非 inotify")
+    i.set_defaults(func=_cmd_inplace)
+
+    r = sub.add_parser("rename", help="批量重命名 MD 文件")
+    r.add_argument("folder")
+    r.add_argument("--pattern", default="{original}_{num}", help="支持 {original} {num} {date}")
+    r.add_argument("--start", type=int, default=1)
+    r.add_argument("--pad", type=int, default=3)
+    r.add_argument("--dry-run", action="store_true", help="只输出预览")
+    r.add_argument("--relink", nargs="?", const="", metavar="ROOT",
+                   help="同时改写 ROOT（默认为 folder）内指向被重命名笔记的 [文字](旧名.md) 链接")
+    r.set_defaults(func=_cmd_rename)
+
+    u = sub.add_parser("undo", help="撤销最近一次重命名 / 原地整理（历史跨会话保存）")
+    u.set_defaults(func=_cmd_undo)
+
+    v = sub.add_parser("recover", help=f"处理中断操作留下的日志（{JOURNAL_DIR}）：默认回滚到操作前")
+    v.add_argument("folder", help="迁移的目标目录 / 原地整理的目录 / 清理文件所在目录")
+    v.add_argument("--replay", action="store_true", help="改为补做剩余步骤")
+    v.set_defaults(func=_cmd_recover)
+    return p
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    core = MarkdownLogicCore()
+    core.profile = args.profile
+    col = _Collector(core, args.quiet)
+    _install_sigint(core)
+    try:
+        code, result = args.func(core, col, args)
+    except KeyboardInterrupt:
+        code, result = EXIT_INTERRUPTED, {"ok": False, "message": "已中断"}
+    core.flush_log()
+    if core._cancel.is_set():
+        code = EXIT_INTERRUPTED
+    if args.stats:
+        with open(args.stats, 'w', encoding='utf-8') as f:
+            json.dump([st.to_dict() for st in col.stats], f, ensure_ascii=False, indent=2)
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    return code
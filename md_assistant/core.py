@@ -0,0 +1,1093 @@
+"""Markdown 小助手业务逻辑：审计、迁移、重命名、原地整理。
+
+不依赖 Qt，可在无界面环境（命令行、CI、服务进程）中直接使用；
+结果通过与 Qt 同名接口的纯 Python 事件（见 events.py）回调，
+也可用 MarkdownLogicCore.subscribe 以 fn(事件名, *参数) 的形式统一接收。
+"""
+import os
+import shutil
+import re
+import logging
+import functools
+import time
+import queue
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from urllib.parse import urlparse
+
+from .events import Signal
+from .metrics import RunStats
+from .channel import LogChannel
+from .index import (
+    IMG_EXTS, LINK_PATTERN, ImageTreeIndex, LocalBlobIndex, AuditCache, LinkIndex, NameRegistry, link_path, relink,
+)
+from .refs import image_refs, image_paths, outside_code, rewrite_paths
+from .watch import FolderWatcher, WATCH_DEBOUNCE
+from .journal import Journal, JournalPending, atomic_write, held, pending, recover
+from .history import UndoBatch, UndoLog, UNDO_LOG_PATH
+from .fetch import (
+    RemoteFetcher, DownloadCache, DOWNLOAD_WORKERS, DOWNLOAD_PER_HOST, DOWNLOAD_MAX_MB, DOWNLOAD_TYPES,
+)
+
+logger = logging.getLogger(__name__)
+
+MERGE_BUFFER = 1024 * 1024   # 合并文档写入缓冲
+INPLACE_WORKERS = 4          # 递归原地整理时并行处理的目录数
+MIGRATE_DEPTH = 16           # 迁移流水线中已读入、尚未写出的文档上限（背压）
+MIGRATE_READERS = 2          # 迁移时预读、解析文档的线程数
+MIGRATE_IO_WORKERS = 4       # 迁移时复制本地图片的线程数
+WATCH_BUSY_WAIT = 0.5        # 监视的目录正被其他操作改动时，隔多久检查一次它是否结束（秒）
+LISTING_RACY_NS = 2_000_000_000   # 目录 mtime 距今不足此值时不缓存列表（同一时间粒度内的改动可能不改变 mtime）
+
+
+class RenamePreview:
+    """重命名方案：第 i 行 (旧名, 新名) 按需计算，日期只取一次，不拼接整段文本"""
+
+    def __init__(self, files, pattern, start, pad, gen=None):
+        self.files, self.pattern, self.start, self.pad = files, pattern, start, pad
+        self.gen = gen   # 请求方给出的编号，原样带回，用于丢弃过时的预览
+        self.date = datetime.now().strftime("%Y%m%d")
+
+    def __len__(self): return len(self.files)
+
+    def __getitem__(self, i):
+        old = self.files[i]
+        base, ext = os.path.splitext(old)
+        return old, (self.pattern
+                     .replace("{original}", base)
+                     .replace("{num}", str(self.start + i).zfill(self.pad))
+                     .replace("{date}", self.date)) + ext
+
+    def text(self):
+        """与旧版预览框相同格式的完整文本（命令行 --dry-run 用）"""
+        return f"预览 {len(self)} 个文件:\n" + "-"*30 + "\n" + "".join(f"{o} -> {n}\n" for o, n in self)
+
+
+class InplacePlan:
+    """原地整理预览的产物，交给 process_inplace 直接执行。
+
+    notes: MD 路径 -> (mtime_ns, size, 全文, [ImageRef], [(原引用, 源图片路径, 目标文件名)])；
+    执行时 MD 的 mtime/size 未变则复用全文、引用与步骤，否则重新读取解析。
+    """
+
+    def __init__(self, folder, recursive=False):
+        self.folder, self.recursive = folder, recursive
+        self.groups = []   # [(目录, [MD 文件名])]
+        self.notes = {}
+        self.md_cnt = self.img_cnt = 0
+        self.reused = 0
+
+    def take(self, fp):
+        """返回 (全文, 引用, 步骤)；文件自预览后有变化或未能预读时返回 None"""
+        e = self.notes.get(fp)
+        if e is None: return None
+        try:
+            st = os.stat(fp)
+        except OSError:
+            return None
+        if (st.st_mtime_ns, st.st_size) != e[:2]: return None
+        self.reused += 1
+        return e[2:]
+
+
+def _norm(path): return os.path.normpath(path.strip()).replace("\\", "/")
+
+
+def _read_text(fpath, stats, errors=None):
+    """按 UTF-8 读入全文，并记入读取的文件数与字节数"""
+    with open(fpath, 'r', encoding='utf-8', errors=errors) as f:
+        txt = f.read()
+        stats.add(read_files=1, read_bytes=os.fstat(f.fileno()).st_size)
+    return txt
+
+
+def _utf8_len(s): return len(s) if s.isascii() else len(s.encode('utf-8'))
+
+
+def _refs_of(fpath, stats):
+    """读取 MD，返回本地图片引用的 normpath 绝对路径集合；读取失败时抛出异常"""
+    md_dir = os.path.dirname(fpath)
+    c = _read_text(fpath, stats, 'ignore')
+    with stats.timed("parse"):
+        paths = image_paths(c)
+    ref_abs = set()
+    for m in paths:
+        if m.startswith('http'): continue
+        ref_abs.add(os.path.normpath(os.path.join(md_dir, _norm(m))))
+    return ref_abs
+
+
+def _audit_chunk(paths):
+    """进程池任务：解析一批 MD，返回 (引用路径集合, 成功解析的 MD 所在目录集合, 统计, [(文件, 错误信息)])"""
+    refs, dirs, errs, st = set(), set(), [], RunStats("audit")
+    for p in paths:
+        try:
+            refs |= _refs_of(p, st)
+            dirs.add(os.path.dirname(p))
+        except Exception as e:
+            errs.append((p, str(e)))
+    return refs, dirs, st.snapshot(), errs
+
+
+def _parse_chunk(paths):
+    """进程池任务（增量审计用）：返回 ({MD: 引用路径集合}, 统计, [(文件, 错误信息)])，以便逐文件写入缓存"""
+    out, errs, st = {}, [], RunStats("audit")
+    for p in paths:
+        try:
+            out[p] = _refs_of(p, st)
+        except Exception as e:
+            errs.append((p, str(e)))
+    return out, st.snapshot(), errs
+
+
+def _measured(kind):
+    """操作入口装饰器：每次运行新建 self.stats，结束后发出 stats_ready；
+    self.profile 不为 None 时用 cProfile 记录本次运行（只覆盖调用线程，流水线等工作线程不在其中）"""
+    def deco(fn):
+        @functools.wraps(fn)
+        def run(self, *args, **kw):
+            self.stats = st = RunStats(kind)
+            prof = None
+            if self.profile is not None:
+                import cProfile   # 只在开启性能分析时导入，不拖慢引擎导入
+                prof = cProfile.Profile()
+                try:
+                    prof.enable()
+                except ValueError:   # 同一时刻只能有一个分析器（如另一个操作正在分析）
+                    prof = None
+            try:
+                return fn(self, *args, **kw)
+            finally:
+                self._chan.end()
+                self._chan.flush()
+                if prof:
+                    prof.disable()
+                    try:
+                        st.attach_profile(prof, self.profile or None)
+                    except OSError as e:
+                        self.log(f"[错误] 保存性能分析失败: {e}")
+                st.finish()
+                self.stats_ready.emit(st)
+        return run
+    return deco
+
+
+class MarkdownLogicCore:
+    log_batch            = Signal(list)     # ([消息, ...],)：日志按固定频率成批发出，见 channel.py
+    progress             = Signal(dict)     # 进度：kind / done / total / bytes / rate / bytes_rate / eta / finished
+    task_finished        = Signal(bool, str)
+    scan_finished        = Signal(list)
+    info_ready           = Signal(dict)
+    rename_preview_ready = Signal(object)   # (RenamePreview,)
+    rename_count_ready   = Signal(int)   # 改进4：传递文件数
+    undo_available       = Signal(int)   # 改进8：传可撤销步数（0=不可撤销）
+    stats_ready          = Signal(object)   # (RunStats,)：每个操作结束时的运行统计
+
+    EVENTS = ("log_batch", "progress", "task_finished", "scan_finished", "info_ready",
+              "rename_preview_ready", "rename_count_ready", "undo_available",
+              "stats_ready")
+
+    def __init__(self, undo_path=UNDO_LOG_PATH):
+        """undo_path：撤销历史文件，None 表示只保存在内存中（退出即丢失）"""
+        self._link_re = re.compile(LINK_PATTERN)
+        self.history = UndoLog(undo_path)  # 重命名 / 原地整理的撤销栈
+        self._cancel = threading.Event()  # 改进9：取消标志
+        self._own_cancel = True             # fork 时由调度器传入取消标志，操作开始时不再清除
+        self._names = NameRegistry()        # 本次操作的目标文件名登记（每个操作开始时重建）
+        self._move_lock = threading.Lock()  # 并行原地整理时保护“检查源图片 + 移动”
+        self._journal = None                # 当前操作的日志（见 journal.py）
+        self._undo = None                   # 当前操作的撤销批次（见 history.py）
+        self._listing = (None, None, None)  # 重命名预览的目录列表缓存：(目录, mtime_ns, MD 文件名)
+        self.stats = RunStats("idle")       # 当前 / 最近一次操作的运行统计（见 metrics.py）
+        self.profile = None                 # 性能分析：None 关闭；"" 只在统计中列出热点；路径 另存为 .prof
+        self._chan = LogChannel(self.log_batch.emit, self.progress.emit, logger,
+                                lambda: self.stats.counters.get("read_bytes", 0))
+
+    def log(self, msg): self._chan.log(msg)
+    def flush_log(self): self._chan.flush()
+    def normalize_path(self, path): return _norm(path)
+
+    def subscribe(self, fn):
+        """订阅全部事件，回调形式为 fn(事件名, *参数)；返回取消订阅的函数"""
+        slots = [(n, lambda *a, n=n: fn(n, *a)) for n in self.EVENTS]
+        for n, slot in slots: getattr(self, n).connect(slot)
+        def unsubscribe():
+            for n, slot in slots: getattr(self, n).disconnect(slot)
+        return unsubscribe
+
+    def fork(self, cancel=None):
+        """派生一个引擎供并发任务使用：共享撤销历史与事件出口，取消标志与操作状态（日志、名册等）各自独立"""
+        c = type(self)(undo_path=None)
+        c.history, c.profile = self.history, self.profile
+        if cancel is not None: c._cancel, c._own_cancel = cancel, False
+        for name in self.EVENTS:
+            getattr(c, name).connect(getattr(self, name).emit)
+        return c
+
+    def cancel(self):
+        """通知正在运行的长任务停止"""
+        self._cancel.set()
+
+    def _reset_cancel(self):
+        if self._own_cancel: self._cancel.clear()
+
+    def _get_unique_path(self, target_dir, filename):
+        """分配不重名的目标路径（重名时追加 _1、_2…）；查内存名册，不逐个 os.path.exists"""
+        return self._names.reserve(target_dir, filename)
+
+    def _two_phase(self, pairs, move=os.rename):
+        """批量执行 [(源, 目标)] 移动，逐个产出 (源, 目标, 异常或 None)。
+
+        目标恰好是另一个待移走的源（如 a→b、b→a）时，先把全部源改为临时名，再逐个落到目标。
+        """
+        srcs = {os.path.normcase(s) for s, _ in pairs}
+        if not any(os.path.normcase(t) in srcs for _, t in pairs):
+            staged = [(s, s, t) for s, t in pairs]
+        else:
+            staged = []
+            for s, t in pairs:
+                tmp = os.path.join(os.path.dirname(s), f".~{os.path.basename(s)}.{os.getpid()}.mvtmp")
+                try:
+                    move(s, tmp); staged.append((s, tmp, t))
+                except OSError as e:
+                    yield s, t, e
+        for s, cur, t in staged:
+            try:
+                move(cur, t)
+            except OSError as e:
+                if cur != s:
+                    try: move(cur, s)
+                    except OSError: pass
+                yield s, t, e
+                continue
+            yield s, t, None
+
+    def _rewrite_links(self, txt, mapping, rx=None):
+        """单遍改写链接：mapping 为 {旧路径: 新路径}，最后一次 join。
+        rx 缺省时改写图片引用（见 refs.py），否则按 rx 的第 1 组（如笔记间链接）改写；两者都跳过代码中的内容"""
+        if rx is None: return rewrite_paths(txt, mapping)
+        if not mapping: return txt
+        out, last = [], 0
+        for m in outside_code(rx, txt):
+            new = mapping.get(m.group(1))
+            if new is None: continue
+            out.append(txt[last:m.start(1)]); out.append(new)
+            last = m.end(1)
+        if not out: return txt
+        out.append(txt[last:])
+        return "".join(out)
+
+    # --- Journal ---
+    @contextmanager
+    def _journaled(self, root, kind):
+        """在 root 下记录本次操作；正常结束即提交，出错时回滚本次的改动并删除日志。
+        只有回滚失败或进程被中断（KeyboardInterrupt 等）时才保留日志供 recover_journal"""
+        jr = Journal(root, kind)
+        self._journal = jr
+        try:
+            yield jr
+        except Exception:
+            self._journal = None
+            try:
+                n = jr.rollback(self.log)
+                self.log(f"[日志] 操作出错，已回滚本次的 {n} 项改动")
+            except Exception as e:
+                self.log(f"[日志] 操作出错且回滚未完成：{e}")
+            if self._undo is not None:   # 已回滚的改动不再记入撤销历史
+                self._undo = UndoBatch(self._undo.kind, self._undo.root)
+            raise
+        except BaseException:
+            jr.close()
+            self.log(f"[日志] 操作未完成，可在 {root} 执行恢复以回滚或补做")
+            raise
+        else:
+            jr.commit()
+        finally:
+            self._journal = None
+
+    @contextmanager
+    def _undoable(self, kind, root):
+        """收集本次操作的移动与链接改写；无论成功、取消还是出错，已完成的部分都记入撤销历史"""
+        self._undo = UndoBatch(kind, root)
+        try:
+            yield self._undo
+        finally:
+            batch, self._undo = self._undo, None
+            if batch:
+                self.history.push(batch)
+                self.undo_available.emit(len(self.history))
+
+    def _move(self, src, dst, unit=None):
+        if self._journal: self._journal.move(src, dst, unit)
+        else: shutil.move(src, dst)
+        if self._undo is not None: self._undo.moved(src, dst)
+        self.stats.add(moves=1)
+
+    def _copy(self, src, dst):
+        with self.stats.timed("copy"):
+            shutil.copy2(src, dst)
+        self.stats.add(copies=1)
+        return dst
+
+    def _mig_copy(self, src, dst):
+        """迁移中的单个复制：失败时记日志并返回空串，不中断整个迁移"""
+        try:
+            return self._copy(src, dst)
+        except OSError as e:
+            self.log(f"[错误] 复制 {os.path.basename(src)} 失败: {e}")
+            try:
+                os.remove(dst)   # 可能留下不完整的副本
+            except OSError:
+                pass
+            return ""
+
+    def _created(self, path):
+        if self._journal: self._journal.create(path)
+
+    def _write_text(self, path, txt, unit=None):
+        with self.stats.timed("write"):
+            if self._journal: self._journal.write_text(path, txt, unit)
+            else: atomic_write(path, txt)
+        self.stats.add(write_files=1, write_bytes=_utf8_len(txt))
+
+    def recover_journal(self, root, replay=False):
+        """回滚（默认）或补做 root 下中断的操作"""
+        try:
+            kind, n = recover(root, replay, self.log)
+            if kind is None: return self.task_finished.emit(False, "没有需要恢复的操作")
+            self.task_finished.emit(True, f"{'补做' if replay else '回滚'}完成（{kind}），处理 {n} 项。")
+        except Exception as e:
+            self.task_finished.emit(False, str(e))
+
+    # --- Rename Logic ---
+    def _md_listing(self, folder, fresh=False):
+        """目录下 MD 文件名（已排序）；目录 mtime 未变时复用上次结果，fresh=True 强制重新列出"""
+        mt = os.stat(folder).st_mtime_ns
+        self.stats.add(stat=1)
+        f0, m0, files = self._listing
+        if not fresh and f0 == folder and m0 == mt: return files
+        files = sorted([f for f in os.listdir(folder) if f.lower().endswith(".md")])
+        racy = time.time_ns() - mt < LISTING_RACY_NS
+        self._listing = (folder, None if racy else mt, files)
+        return files
+
+    @_measured("rename")
+    def execute_rename_batch(self, folder, pattern, start_num, pad, relink_root=None):
+        """relink_root 不为空时，同时改写该目录树内所有指向被重命名笔记的 [文字](旧名.md) 链接"""
+        if not os.path.isdir(folder): return self.task_finished.emit(False, "无效文件夹")
+        try:
+            files = self._md_listing(folder, fresh=True)
+            if not files: return self.task_finished.emit(False, "无 MD 文件")
+            self.stats.add(md_files=len(files))
+            plan = RenamePreview(files, pattern, start_num, pad)
+            succ, moved, links = 0, {}, None
+            self.log(f"--- [重命名] 开始: {len(files)} 文件 ---")
+            if relink_root:
+                # 改名前先建一次反向链接索引，之后只需改写受影响的笔记
+                with self.stats.timed("links"):
+                    links = LinkIndex(relink_root, [os.path.join(folder, f) for f in files])
+                self.log(f"[链接] 已扫描 {links.scanned} 篇笔记")
+            # 名册中先让出所有将被改名的源文件名，目标只与不参与改名的文件冲突
+            self._names = NameRegistry()
+            changing = [(old, new) for old, new in plan if old != new]
+            for old, _ in changing: self._names.release(folder, old)
+            pairs = [(os.path.join(folder, old), self._get_unique_path(folder, new)) for old, new in changing]
+            self._chan.begin("rename", len(pairs))
+            with self._undoable("rename", folder) as undo:
+                for op, np, err in self._two_phase(pairs):
+                    self._chan.advance()
+                    if err:
+                        self.log(f"[错误] 重命名 {os.path.basename(op)} 失败: {err}"); continue
+                    undo.moved(op, np); succ += 1
+                    moved[os.path.normpath(os.path.abspath(op))] = os.path.normpath(os.path.abspath(np))
+                    self.log(f"Ren: {os.path.basename(op)} -> {os.path.basename(np)}")
+                if links is not None and moved: self._relink_notes(links, moved)
+            if succ:
+                self.task_finished.emit(True, f"成功重命名 {succ} 个文件")
+            else:
+                self.task_finished.emit(True, "无变更")
+        except Exception as e:
+            self.task_finished.emit(False, str(e))
+
+    def _relink_notes(self, links, moved):
+        """改写链接到被改名文件的笔记；moved 为 {旧绝对路径: 新绝对路径}，笔记本身也可能刚被改名"""
+        n = 0
+        for note in sorted(links.linking(moved)):
+            cur, d = moved.get(note, note), os.path.dirname(note)
+            try:
+                txt = _read_text(cur, self.stats)
+                mapping = {}
+                for m in outside_code(self._link_re, txt):
+                    raw = m.group(1)
+                    if raw in mapping: continue
+                    t = os.path.normpath(os.path.join(d, link_path(raw)))
+                    if t in moved: mapping[raw] = relink(raw, os.path.basename(moved[t]))
+                new = self._rewrite_links(txt, mapping, self._link_re)
+                if new != txt:
+                    self._write_text(cur, new)
+                    if self._undo is not None: self._undo.relinked(cur, mapping, 'lk')
+                    n += 1
+            except Exception as e:
+                self.log(f"[错误] 更新链接失败 {os.path.basename(cur)}: {e}")
+        self.stats.add(relinked=n)
+        self.log(f"[链接] 已更新 {n} 篇笔记中的链接")
+
+    @_measured("undo")
+    def undo_last(self):
+        """撤销最近一批重命名 / 原地整理（历史持久化，重启后仍可撤销）：先改回链接，再逆序移回文件。
+        有失败的项时，只把失败的部分留在历史中，处理后可再次撤销"""
+        b = self.history.peek()
+        if b is None: return self.task_finished.emit(False, "无撤销记录")
+        root, cnt, errs = b['root'], 0, 0
+        rest, failed = {}, set()   # 留待再次撤销的链接 / 未能移回的现路径
+        try:
+            with self._journaled(root, "undo"):
+                for key, rx in (('ln', None), ('lk', self._link_re)):
+                    for note, m in b.get(key, {}).items():
+                        fp = os.path.join(root, note)
+                        try:
+                            txt = _read_text(fp, self.stats)
+                            new = self._rewrite_links(txt, m, rx)
+                            if new != txt: self._write_text(fp, new)
+                        except Exception as e:
+                            errs += 1; self.log(f"[错误] 还原链接失败 {note}: {e}")
+                            rest.setdefault(key, {})[note] = m
+                pairs = [(os.path.join(root, cur), os.path.join(root, orig)) for cur, orig in reversed(b['mv'])]
+                pairs = [(cp, op) for cp, op in pairs if os.path.exists(cp)]
+                curs = {os.path.normcase(cp) for cp, _ in pairs}
+                todo = []
+                for cp, op in pairs:
+                    if os.path.exists(op) and os.path.normcase(op) not in curs:   # 原位置被批次外的文件占用
+                        errs += 1; failed.add(cp)
+                        if errs <= 20: self.log(f"[错误] 撤销失败: {os.path.basename(op)} 已存在")
+                        continue
+                    os.makedirs(os.path.dirname(op), exist_ok=True)
+                    todo.append((cp, op))
+                for cp, op, err in self._two_phase(todo, self._move):
+                    if err is None: cnt += 1; continue
+                    errs += 1; failed.add(cp)
+                    if errs <= 20: self.log(f"[错误] 撤销失败: {err}")   # 大批量时避免刷屏
+        except JournalPending as e:
+            return self.task_finished.emit(False, str(e))
+        if failed: rest['mv'] = [e for e in b['mv'] if os.path.join(root, e[0]) in failed]
+        if rest: rest.update(k=b['k'], t=b['t'], root=root)
+        self.history.pop(rest)
+        self.undo_available.emit(len(self.history))
+        if rest:
+            return self.task_finished.emit(False, f"已撤销 {cnt} 个文件，{errs} 项失败；失败的部分仍保留在撤销历史中，处理后可再次撤销")
+        self.task_finished.emit(True, f"已撤销 {cnt} 个文件")
+
+    def generate_rename_preview(self, folder, pattern, start, pad, cancel=None, gen=None):
+        """cancel 为本次请求的取消标志，被更新的请求取代时不再发出结果；gen 原样记入 plan.gen"""
+        if not folder or not os.path.isdir(folder):
+            self.rename_count_ready.emit(0)
+            return
+        try:
+            files = self._md_listing(folder)
+            if cancel is not None and cancel.is_set(): return
+            plan = RenamePreview(files, pattern, start, pad, gen)
+            self.rename_preview_ready.emit(plan)
+            self.rename_count_ready.emit(len(plan))   # 改进4
+        except Exception as e:
+            self.log(f"[错误] 预览生成失败: {e}")
+            self.rename_count_ready.emit(0)
+
+    # --- Audit Logic ---
+    @_measured("audit")
+    def analyze_path_entry(self, ipath, workers=1, use_cache=False):
+        """workers > 1 时批量审计用多进程解析 MD（结果与串行完全一致）；
+        use_cache 时在扫描根目录维护增量缓存，只重新解析变化的 MD、只重新列出变化的目录"""
+        self.log(f"--- [审计] {ipath} ---")
+        if os.path.isfile(ipath): self._analyze_single(ipath)
+        elif os.path.isdir(ipath): self._analyze_batch(ipath, workers, use_cache)
+        else: self.task_finished.emit(False, "路径无效")
+
+    def _analyze_batch(self, root, workers=1, use_cache=False):
+        # 单次 scandir 建立整棵树的索引，各 MD 的图片查询都从索引回答
+        cache = AuditCache(root) if use_cache else None
+        with self.stats.timed("walk"):
+            index = ImageTreeIndex(root, cache)
+        mds = index.mds
+        self.stats.add(md_files=len(mds), dirs=len(index.children))
+        self._chan.begin("audit", len(mds))
+        # 改进6：全局 union，去重后再统计
+        if cache is not None:
+            all_ref_abs, audited_dirs = self._cached_refs(mds, index, cache, workers)
+        elif workers > 1 and len(mds) > 1:
+            all_ref_abs, audited_dirs = self._parallel_refs(mds, workers)
+        else:
+            all_ref_abs, audited_dirs = set(), set()
+            for m in mds:
+                refs = self._collect_refs(m)
+                self._chan.advance()
+                if refs is not None:
+                    all_ref_abs |= refs
+                    audited_dirs.add(os.path.dirname(m))
+        all_img_abs = index.images_under(audited_dirs)
+        reds = list(all_img_abs - all_ref_abs)
+        self.info_ready.emit({
+            "md_cnt":  len(mds),
+            "ref_cnt": len(all_ref_abs),
+            "phy_cnt": len(all_img_abs),
+            "red_cnt": len(reds),
+            "red_list": reds,
+            "scan_root": root,
+        })
+
+    def _analyze_single(self, fpath):
+        r = self._core_audit(fpath)
+        if r:
+            reds = list(r['img_abs'] - r['ref_abs'])
+            self.info_ready.emit({
+                "md_cnt":  1,
+                "ref_cnt": len(r['ref_abs']),
+                "phy_cnt": len(r['img_abs']),
+                "red_cnt": len(reds),
+                "red_list": reds,
+                "scan_root": os.path.dirname(fpath),
+            })
+
+    def _run_chunks(self, fn, mds, workers):
+        """把 MD 列表分块交给进程池执行 fn(块)，按完成顺序逐个产出结果（错误已记日志）"""
+        n = min(len(mds), workers * 4)
+        chunks = [mds[i::n] for i in range(n)]
+        self.log(f"[并行] {len(mds)} 个 MD 分 {n} 块，{workers} 进程")
+        # 统一用 spawn：GUI 进程含多个线程，fork 不安全；引擎模块导入很轻，spawn 开销可忽略。
+        # 进程池相关模块只在并行审计时导入
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as ex:
+            futs = {ex.submit(fn, c): len(c) for c in chunks}
+            for f in as_completed(futs):
+                *res, snap, errs = f.result()
+                self.stats.merge(snap)
+                self._chan.advance(futs[f])
+                for p, e in errs:
+                    self.log(f"[错误] 审计 {os.path.basename(p)} 失败: {e}")
+                yield res
+
+    def _parallel_refs(self, mds, workers):
+        """多进程解析，在主进程合并引用集合与已解析目录"""
+        all_ref_abs, audited_dirs = set(), set()
+        for refs, dirs in self._run_chunks(_audit_chunk, mds, workers):
+            all_ref_abs |= refs
+            audited_dirs |= dirs
+        return all_ref_abs, audited_dirs
+
+    def _cached_refs(self, mds, index, cache, workers):
+        """增量审计：未变化的 MD 直接取缓存中的引用，只解析变化的 MD，最后写回缓存"""
+        known, todo = cache.split_notes(mds)
+        self._chan.advance(len(known))
+        parsed = {}
+        if workers > 1 and len(todo) > 1:
+            for (res,) in self._run_chunks(_parse_chunk, todo, workers):
+                parsed.update(res)
+        else:
+            for m in todo:
+                refs = self._collect_refs(m)
+                self._chan.advance()
+                if refs is not None: parsed[m] = refs
+        all_ref_abs, audited_dirs = set(), set()
+        for src in (known, parsed):
+            for m, refs in src.items():
+                all_ref_abs.update(refs)
+                audited_dirs.add(os.path.dirname(m))
+        self.stats.add(audit_cache_hits=len(known), audit_cache_dirs=index.reused)
+        self.log(f"[缓存] 复用 {len(known)} 个 MD、{index.reused} 个目录；重新解析 {len(todo)} 个 MD")
+        try:
+            cache.save(index.snapshot, {**known, **parsed})
+        except OSError as e:
+            self.log(f"[错误] 保存审计缓存失败: {e}")
+        return all_ref_abs, audited_dirs
+
+    def _collect_refs(self, fpath):
+        """返回 MD 中本地图片引用的 normpath 绝对路径集合；读取失败返回 None"""
+        try:
+            return _refs_of(fpath, self.stats)
+        except Exception as e:
+            self.log(f"[错误] 审计 {os.path.basename(fpath)} 失败: {e}")
+            return None
+
+    def _core_audit(self, fpath, index=None):
+        """返回 {ref_abs: set[str], img_abs: set[str]}，路径均为 normpath 绝对路径
+
+        index 为已建立的 ImageTreeIndex（需覆盖该文件所在目录）；缺省时只为该目录建索引。
+        """
+        ref_abs = self._collect_refs(fpath)
+        if ref_abs is None: return None
+        md_dir = os.path.dirname(fpath)
+        if index is None: index = ImageTreeIndex(md_dir)
+        return {"ref_abs": ref_abs, "img_abs": index.images_under([md_dir])}
+
+    @_measured("cleanup")
+    def cleanup_files(self, fl, forever):
+        fl = [p for p in fl if os.path.exists(p)]
+        if not fl: return 0
+        cnt = 0
+        self._chan.begin("cleanup", len(fl))
+        try:
+            with self._journaled(os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in fl]), "cleanup") as jr:
+                for p in fl:
+                    try:
+                        if forever:
+                            jr.delete(p); self.log(f"[删] {os.path.basename(p)}")
+                        else:
+                            bd = os.path.join(os.path.dirname(p), "unused_backup")
+                            os.makedirs(bd, exist_ok=True)
+                            self._move(p, os.path.join(bd, os.path.basename(p)))
+                            self.log(f"[移] {os.path.basename(p)}")
+                        cnt += 1
+                    except Exception as e:
+                        self.log(f"[错误] 清理失败: {e}")
+                    self._chan.advance()
+        except JournalPending as e:
+            self.log(f"[错误] {e}")
+        return cnt
+
+    # --- Migration Logic ---
+    @_measured("migrate")
+    def process_migration(self, src, dst, cfg):
+        self._reset_cancel()
+        try:
+            fs = []
+            if os.path.isfile(src): fs = [src]
+            elif os.path.isdir(src):
+                with self.stats.timed("walk"):
+                    fs = [os.path.join(r, f) for r, _, x in os.walk(src) for f in x if f.endswith('.md')]
+
+            if not fs: return self.task_finished.emit(False, "无 MD 文件")
+
+            out_md = os.path.abspath(os.path.join(dst, "合并后的文档.md"))
+            fs = [f for f in fs if os.path.abspath(f) != out_md]
+            self.stats.add(md_files=len(fs))
+            self._chan.begin("migrate", len(fs))
+
+            # 未使用图片扫描只需要引用的文件名，不保留处理后的全文
+            refs = set()
+            self._names = NameRegistry()
+            blobs = LocalBlobIndex()
+            self.log(f"--- [迁移] {len(fs)} 文件 -> {dst} ---")
+
+            with self._journaled(dst, "migrate") as jr:
+                # 合并模式：逐篇流式写入临时文件，全部完成后再原子替换为合并文档
+                merged = open(out_md + ".part", 'w', encoding='utf-8', buffering=MERGE_BUFFER) if cfg['merge'] else None
+
+                def emit(f, cnt, paths):
+                    self.log(f"处理: {os.path.basename(f)}")
+                    if cfg['cleanup']: refs.update(self._ref_names(paths))
+                    if merged:
+                        merged.write(f"\n\n# {os.path.basename(f)}\n\n"); merged.write(cnt)
+                        self.stats.add(write_bytes=_utf8_len(cnt))
+                    else: self._write_text(os.path.join(dst, os.path.basename(f)), cnt)
+                    self._chan.advance()
+
+                try:
+                    if not self._mig_pipeline(fs, dst, cfg, blobs, emit):   # 改进9：已取消
+                        self.task_finished.emit(False, "已取消")
+                        return
+                    if merged:
+                        merged.close()
+                        jr.replace(merged.name, out_md)
+                        self.log(f"合并完成: {out_md}")
+                finally:
+                    if merged and not merged.closed: merged.close()
+                    if merged and os.path.exists(merged.name): os.remove(merged.name)
+            if blobs.hits:
+                self.stats.add(dedupe_hits=blobs.hits)
+                self.log(f"[去重] {blobs.hits} 处本地图片引用复用已有副本")
+
+            unused = self._scan_unused(refs, dst) if cfg['cleanup'] else []
+            self.scan_finished.emit(unused)
+            self.task_finished.emit(True, f"迁移成功！已处理 {len(fs)} 个文件。")
+        except Exception as e:
+            self.task_finished.emit(False, str(e))
+
+    def _mig_tdir(self, fpath, root, cfg):
+        name = os.path.splitext(os.path.basename(fpath))[0]
+        return os.path.join(root, "images", name) if cfg['subfolder'] else os.path.join(root, "images")
+
+    def _mig_pipeline(self, fs, root, cfg, blobs, emit):
+        """流式迁移 fs，按原顺序对每篇调用 emit(文件, 改写后全文, 改写后的图片路径)；被取消时返回 False。
+
+        读取/解析 → 分配目标路径 → 复制/下载 → 改写并写出，各阶段重叠执行：
+        - 预读线程池至多领先 MIGRATE_DEPTH 篇读取文档、提取图片引用；
+        - 分配线程按文件顺序查重、占用目标文件名（重名编号与串行执行一致），
+          本地图片交给复制线程池，远程图片交给下载器，同一 URL 整批只下载一次；
+        - 当前线程按原顺序等待每篇的图片就绪后改写链接。
+        阶段之间的队列有界，写出落后时前面的阶段自动停下，内存中的文档数不超过 2 × MIGRATE_DEPTH。
+        """
+        out, stop = queue.Queue(MIGRATE_DEPTH), threading.Event()
+        io = ThreadPoolExecutor(MIGRATE_IO_WORKERS, thread_name_prefix="md-copy")
+        dl = {'fetcher': None, 'cache': None}
+        remote = {}
+
+        def fetch(u, tdir):
+            if dl['fetcher'] is None:   # 首个远程图片出现时才创建下载器（导入 requests）
+                dl['fetcher'] = RemoteFetcher(cfg.get('download_workers', DOWNLOAD_WORKERS),
+                                              cfg.get('download_per_host', DOWNLOAD_PER_HOST), cancel=self._cancel,
+                                              max_mb=cfg.get('download_max_mb', DOWNLOAD_MAX_MB),
+                                              types=cfg.get('download_types', DOWNLOAD_TYPES))
+                dl['cache'] = DownloadCache(cfg['download_cache']) if cfg.get('download_cache') else None
+            return dl['fetcher'].submit(self._download, dl['fetcher'], u, tdir, root, dl['cache'])
+
+        def resolve(f, txt, refs):
+            if txt is None: return f, None, None, [], {}   # 已跳过的文档
+            urls = image_paths(txt, refs)
+            tdir = self._mig_tdir(f, root, cfg)
+            os.makedirs(tdir, exist_ok=True)
+            slots, n_stat = {}, 0
+            for u in urls:
+                if u.startswith('http'):
+                    if cfg['download']:
+                        if u not in remote: remote[u] = fetch(u, tdir)
+                        slots[u] = remote[u]
+                    continue
+                src = os.path.abspath(os.path.join(os.path.dirname(f), self.normalize_path(u)))
+                n_stat += 1
+                if not os.path.isfile(src): continue
+                # 索引中登记的是复制任务本身：重复的图片与首次复制共用同一结果，复制失败时一同保持原链接
+                copied = blobs.lookup(src)
+                if copied is None:
+                    new_abs = self._get_unique_path(tdir, os.path.basename(src))
+                    self._created(new_abs)
+                    copied = io.submit(self._mig_copy, src, new_abs)   # 结果为 new_abs，失败为空串
+                    blobs.add(src, copied)
+                slots[u] = copied
+            self.stats.add(refs=len(urls), stat=n_stat)
+            return f, txt, refs, urls, slots
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=0.2); return True
+                except queue.Full:
+                    pass
+            return False
+
+        def feed():
+            rd = ThreadPoolExecutor(MIGRATE_READERS, thread_name_prefix="md-read")
+            ahead = deque()
+            try:
+                for f in fs:
+                    ahead.append((f, rd.submit(self._mig_parse, f)))
+                    if len(ahead) >= MIGRATE_DEPTH:
+                        f0, fut = ahead.popleft()
+                        if self._cancel.is_set() or not put(resolve(f0, *fut.result())): return
+                while ahead:
+                    f0, fut = ahead.popleft()
+                    if self._cancel.is_set() or not put(resolve(f0, *fut.result())): return
+            except Exception as e:
+                put(e); return
+            finally:
+                rd.shutdown(cancel_futures=True)
+                put(None)
+
+        feeder = threading.Thread(target=feed, name="md-migrate-feed", daemon=True)
+        feeder.start()
+        try:
+            while True:
+                item = out.get()
+                if item is None: return not self._cancel.is_set()
+                if isinstance(item, Exception): raise item
+                if self._cancel.is_set(): return False
+                f, txt, refs, urls, slots = item
+                if txt is None:
+                    self._chan.advance(); continue
+                mapping = {}
+                for u, s in slots.items():
+                    if isinstance(s, Future): s = s.result()   # 复制 / 下载失败为空串，引用保持原样
+                    if s: mapping[u] = self._mig_rel(s, root)
+                emit(f, rewrite_paths(txt, mapping, refs), [mapping.get(u, u) for u in urls])
+        finally:
+            stop.set()
+            feeder.join()
+            io.shutdown(cancel_futures=True)
+            if dl['fetcher']: dl['fetcher'].close()
+            if dl['cache']:
+                try: dl['cache'].save()
+                except OSError as e: self.log(f"[错误] 保存下载缓存失败: {e}")
+
+    def _mig_parse(self, fpath):
+        """读入文档并提取图片引用（之后的改写复用这次的结果，不再重新扫描）；无法读取或解码时返回 (None, None)"""
+        try:
+            txt = _read_text(fpath, self.stats)
+        except (OSError, UnicodeDecodeError) as e:
+            self.log(f"[跳过] {os.path.basename(fpath)} 无法按 UTF-8 读取: {e}")
+            self.stats.add(skipped=1)
+            return None, None
+        with self.stats.timed("parse"):
+            return txt, image_refs(txt)
+
+    def _download(self, fetcher, u, tdir, root, cache=None):
+        """下载单个远程图片到 tdir，返回本地路径；失败返回空串"""
+        entry = cache.lookup(u) if cache else None
+        if entry and cache.is_fresh(entry):
+            self.stats.add(cache_hits=1)
+            self.log(f" [缓存] {os.path.basename(entry['path'])}")
+            return self._reuse_cached(entry['path'], tdir, root)
+        tmp, t, fetched = "", time.perf_counter(), False
+        try:
+            tmp, headers, sha1 = fetcher.fetch_to_temp(u, tdir, DownloadCache.validators(entry) if entry else None)
+            fetched = True
+            self.stats.download(time.perf_counter() - t, os.path.getsize(tmp) if tmp else 0)
+            if tmp is None:   # 304 Not Modified
+                self.stats.add(not_modified=1)
+                cache.refresh(u, headers)
+                self.log(f" [未修改] {os.path.basename(entry['path'])}")
+                return self._reuse_cached(entry['path'], tdir, root)
+            n = os.path.basename(urlparse(u).path)
+            if not n or '.' not in n:
+                cd = headers.get('Content-Disposition', '')
+                m = re.search(r'filename=["\']?([^"\';\s]+)', cd)
+                n = m.group(1) if m else f"web_{int(time.time())}.jpg"
+            # 在名册中占用唯一文件名，再原子替换为已下载完成的临时文件
+            p = self._get_unique_path(tdir, n)
+            self._created(p)
+            os.replace(tmp, p)
+            if cache: cache.store(u, p, headers, sha1)
+            self.log(f" [下载] {n}")
+            return p
+        except Exception as e:
+            if tmp and os.path.exists(tmp): os.remove(tmp)
+            if not fetched: self.stats.download(time.perf_counter() - t, ok=False)
+            self.log(f"[错误] 下载 {u} 失败: {e}")
+            return ""
+
+    def _reuse_cached(self, path, tdir, root):
+        """缓存文件已在本次输出目录内则直接引用，否则复制一份到 tdir"""
+        ap, ar = os.path.abspath(path), os.path.abspath(root)
+        if os.path.commonpath([ap, ar]) == ar: return path
+        os.makedirs(tdir, exist_ok=True)
+        p = self._get_unique_path(tdir, os.path.basename(path))
+        self._created(p)
+        return self._copy(path, p)
+
+    def _mig_rel(self, new_abs, root):
+        """输出文档中引用图片使用的相对路径（文档均写在 root 下）"""
+        return "./" + os.path.relpath(new_abs, root).replace("\\", "/")
+
+    def _ref_names(self, paths):
+        """图片引用路径对应的文件名（_scan_unused 按文件名比对）"""
+        return {os.path.basename(self.normalize_path(r)) for r in paths}
+
+    def _scan_unused(self, refs, root):
+        """refs 为已处理文档中引用的图片文件名集合，返回 root/images 下未被引用的文件"""
+        u = []
+        img_root = os.path.join(root, "images")
+        if os.path.exists(img_root):
+            for r, _, fs in os.walk(img_root):
+                if "unused" in r: continue
+                for f in fs:
+                    if f not in refs: u.append(os.path.join(r, f))
+        return u
+
+    # --- Inplace Logic ---
+    @_measured("inplace")
+    def process_inplace(self, folder, cln, recursive=False, workers=INPLACE_WORKERS, plan=None):
+        """recursive 时整理整棵树：每个含 MD 的目录各自归档到自己的 ./images/，多个目录并行处理。
+
+        plan 为 plan_inplace 的结果时按预览执行，未变动的 MD 不再读取。
+        """
+        self._reset_cancel()
+        try:
+            groups = plan.groups if plan is not None else self._inplace_groups(folder, recursive)
+            total = sum(len(fs) for _, fs in groups)
+            if not total: return self.task_finished.emit(False, "无 MD 文件")
+            self.stats.add(md_files=total, dirs=len(groups))
+            self._chan.begin("inplace", total)
+            if recursive:
+                self.log(f"--- [原地] 递归处理 {len(groups)} 个目录、{total} 文件 ---")
+            else:
+                self.log(f"--- [原地] 处理 {total} 文件 ---")
+            with self._undoable("inplace", folder), self._journaled(folder, "inplace"):
+                if len(groups) > 1 and workers > 1:
+                    with ThreadPoolExecutor(max_workers=workers) as ex:
+                        results = list(ex.map(lambda g: self._inplace_dir(g[0], g[1], cln, plan), groups))
+                else:
+                    results = [self._inplace_dir(d, fs, cln, plan) for d, fs in groups]
+            if self._cancel.is_set():   # 改进9
+                self.task_finished.emit(False, "已取消")
+                return
+            if plan is not None and plan.reused < total:
+                self.log(f" [计划] {total - plan.reused} 个 MD 自预览后有变化，已重新读取")
+            u = []
+            if cln:
+                for (d, _), refs in zip(groups, results): u += self._scan_unused(refs, d)
+            self.scan_finished.emit(u)
+            self.task_finished.emit(True, f"整理完成！已处理 {total} 个文件。")
+        except Exception as e:
+            self.task_finished.emit(False, str(e))
+
+    def _inplace_groups(self, folder, recursive):
+        """返回 [(目录, [MD 文件名])]；递归时跳过 images/ 与 unused_backup/"""
+        if not recursive:
+            return [(folder, [f for f in os.listdir(folder) if f.endswith('.md')])]
+        groups = []
+        with self.stats.timed("walk"):
+            for r, ds, fs in os.walk(folder):
+                ds[:] = [x for x in ds if x not in ('images', 'unused_backup')]
+                mds = [f for f in fs if f.endswith('.md')]
+                if mds: groups.append((r, mds))
+        return groups
+
+    def _inplace_dir(self, d, fs, cln, plan=None):
+        """整理一个目录下的 MD，返回该目录文档引用的图片文件名集合（供清理扫描）"""
+        refs = set()
+        for fn in fs:
+            if self._cancel.is_set(): break
+            paths = self._inplace_one(d, fn, plan=plan)
+            self._chan.advance()
+            if cln: refs |= self._ref_names(paths)
+        return refs
+
+    def _inplace_one(self, folder, fn, missing=None, plan=None):
+        """整理单个 MD：本地图片移入 ./images/{前缀}_{n}.ext 并改写链接，返回整理后文档引用的图片路径。
+
+        编号跳过 images/ 中已存在的文件，重复整理不会覆盖已归档图片；内容未变时不回写。
+        missing 为 dict 时，记录引用了但尚不存在的本地图片：{图片绝对路径: {MD 文件名}}。
+        plan 中有该 MD 且文件未变时，直接使用预览时读到的全文与目标文件名。
+        """
+        fp = os.path.join(folder, fn)
+        md_dir = os.path.dirname(fp)
+        pfx = os.path.splitext(fn)[0]
+        img_dir = os.path.join(md_dir, "images")
+        os.makedirs(img_dir, exist_ok=True)
+        planned = plan.take(fp) if plan is not None else None
+        if planned:
+            orig, refs, steps = planned
+        else:
+            orig = _read_text(fp, self.stats)
+            with self.stats.timed("parse"):
+                refs = image_refs(orig)
+            steps = [(u, src, None) for u, src in self._inplace_refs(md_dir, refs)]
+        n, mapping, drift, n_stat = 0, {}, False, 0
+        for u, src, hint in steps:
+            nn = None
+            with self._move_lock:   # 不同目录的 MD 可能引用同一张图片（如 ../x.png）
+                n_stat += 1
+                if not os.path.exists(src):
+                    drift = drift or bool(hint)   # 计划中的图片已不在，后续编号改为现场分配
+                else:
+                    if hint and not drift and not os.path.exists(os.path.join(img_dir, hint)):
+                        nn = hint
+                    else:
+                        ext = os.path.splitext(src)[1]
+                        n += 1
+                        while os.path.exists(os.path.join(img_dir, f"{pfx}_{n}{ext}")): n += 1; n_stat += 1
+                        n_stat += 1
+                        nn = f"{pfx}_{n}{ext}"
+                    self._move(src, os.path.join(img_dir, nn), fp)
+            if nn:
+                mapping[u] = f"./images/{nn}"
+                self.log(f" [整理] {os.path.basename(src)} -> {nn}")
+            elif missing is not None:
+                missing.setdefault(os.path.normpath(os.path.abspath(src)), set()).add(fn)
+        self.stats.add(refs=len(steps), stat=n_stat)
+        txt = rewrite_paths(orig, mapping, refs)
+        if txt != orig:
+            self._write_text(fp, txt, fp)
+            if self._undo is not None: self._undo.relinked(fp, mapping)
+        return [mapping.get(u, u) for u in image_paths(orig, refs)]
+
+    def _inplace_refs(self, md_dir, refs):
+        """需要归档的本地引用 [(原引用, 源路径)]，按首次出现顺序去重"""
+        out = []
+        for u in image_paths(None, refs):
+            if u.startswith(('http', './images/')): continue
+            out.append((u, os.path.join(md_dir, self.normalize_path(u))))
+        return out
+
+    @_measured("watch")
+    def watch_inplace(self, folder, debounce=WATCH_DEBOUNCE, poll=False):
+        """监视模式：先整理一遍，之后只整理发生变化的 MD，以及其缺失图片刚出现的 MD；cancel() 结束"""
+        self._reset_cancel()
+        if not os.path.isdir(folder): return self.task_finished.emit(False, "无效文件夹")
+        watcher = FolderWatcher(folder, debounce, poll)
+        self.log(f"--- [监视] {folder}（{watcher.backend_name}）---")
+        missing = {}
+        try:
+            self._watch_run(folder, [f for f in os.listdir(folder) if f.endswith('.md')], missing)
+            for batch in watcher.batches(self._cancel):
+                todo = {n for n in batch if n.endswith('.md')}
+                for n in batch:
+                    todo |= missing.pop(os.path.normpath(os.path.abspath(os.path.join(folder, n))), set())
+                self._watch_run(folder, todo, missing)
+        except JournalPending as e:
+            return self.task_finished.emit(False, str(e))
+        finally:
+            watcher.close()
+        self.task_finished.emit(True, "已停止监视")
+
+    def _watch_run(self, folder, todo, missing):
+        """在日志中整理 todo 中的 MD，整理结果作为一批记入撤销历史；
+        目录正被其他操作（原地整理、清理等）改动时先暂停，等它结束再整理。
+        中断留下的日志抛出 JournalPending"""
+        waiting = False
+        while not self._cancel.is_set():
+            try:
+                with self._undoable("inplace", folder), self._journaled(folder, "watch"):   # 每批可单独撤销
+                    for fn in sorted(todo):
+                        if os.path.isfile(os.path.join(folder, fn)): self._watch_fix(folder, fn, missing)
+                return
+            except JournalPending:
+                if not held(folder) and pending(folder) is not None: raise
+            if not waiting:
+                waiting = True
+                self.log("[监视] 目录正被其他操作改动，等待其结束后继续")
+            self._cancel.wait(WATCH_BUSY_WAIT)
+
+    def _watch_fix(self, folder, fn, missing):
+        # 重新整理前先清掉该 MD 旧的缺失记录
+        for notes in missing.values(): notes.discard(fn)
+        try:
+            self._inplace_one(folder, fn, missing)
+        except Exception as e:
+            self.log(f"[错误] 整理 {fn} 失败: {e}")
+
+    def scan_inplace_preview(self, folder, recursive=False):
+        """改进3：扫描原地整理会影响哪些文件，不写磁盘；recursive 时返回整棵树的合计"""
+        plan = self.plan_inplace(folder, recursive)
+        return plan.md_cnt, plan.img_cnt
+
+    def plan_inplace(self, folder, recursive=False):
+        """只读扫描，生成可交给 process_inplace(plan=...) 执行的 InplacePlan；出错时返回空计划"""
+        plan = InplacePlan(folder, recursive)
+        try:
+            plan.groups = self._inplace_groups(folder, recursive)
+            for d, md_files in plan.groups:
+                plan.md_cnt += len(md_files)
+                img_dir = os.path.join(d, "images")
+                taken = set(os.listdir(img_dir)) if os.path.isdir(img_dir) else set()
+                for fn in md_files:
+                    self._plan_note(plan, d, fn, taken)
+        except Exception:
+            return InplacePlan(folder, recursive)
+        return plan
+
+    def _plan_note(self, plan, d, fn, taken):
+        fp = os.path.join(d, fn)
+        st = os.stat(fp)
+        try:
+            with open(fp, 'r', encoding='utf-8') as f:
+                txt = f.read()
+            reusable = True
+        except UnicodeDecodeError:   # 仅用于计数，执行时按原逻辑重新读取（并报错）
+            with open(fp, 'r', encoding='utf-8', errors='ignore') as f:
+                txt = f.read()
+            reusable = False
+        pfx, n, steps, refs = os.path.splitext(fn)[0], 0, [], image_refs(txt)
+        for u, src in self._inplace_refs(d, refs):
+            if not os.path.exists(src):
+                steps.append((u, src, None)); continue
+            ext = os.path.splitext(src)[1]
+            if ext.lower() in IMG_EXTS: plan.img_cnt += 1
+            n += 1
+            while f"{pfx}_{n}{ext}" in taken: n += 1
+            nn = f"{pfx}_{n}{ext}"
+            taken.add(nn)
+            steps.append((u, src, nn))
+        if reusable:
+            plan.notes[fp] = (st.st_mtime_ns, st.st_size, txt, refs, steps)
@@ -0,0 +1,41 @@
+"""与 Qt Signal 同名接口的纯 Python 事件，使引擎无需导入 PySide6。
+
+用法与 Qt 一致：类属性 ``task_finished = Signal(bool, str)`` 声明，实例上 ``connect`` / ``emit``。
+回调在触发 emit 的线程中同步执行；GUI 侧由 Qt 桥接对象负责切回主线程。
+"""
+import threading
+
+
+class BoundSignal:
+    def __init__(self):
+        self._slots = []
+        self._lock = threading.Lock()
+
+    def connect(self, fn):
+        with self._lock:
+            self._slots = self._slots + [fn]
+
+    def disconnect(self, fn=None):
+        with self._lock:
+            self._slots = [] if fn is None else [s for s in self._slots if s != fn]
+
+    def emit(self, *args):
+        for fn in self._slots:
+            fn(*args)
+
+
+class Signal:
+    """类级声明的事件描述符，每个实例首次访问时得到独立的 BoundSignal"""
+    def __init__(self, *types):
+        self.types = types
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None: return self
+        bound = obj.__dict__.get(self.name)
+        if bound is None:
+            bound = obj.__dict__.setdefault(self.name, BoundSignal())
+        return bound
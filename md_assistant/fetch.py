@@ -0,0 +1,164 @@
+"""远程图片下载：连接池 + 有界并发 + 流式落盘，以及按 URL 的持久下载缓存。
+
+requests 在首次创建 RemoteFetcher 时才导入，不下载时 import 本模块几乎没有开销。
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+DOWNLOAD_WORKERS  = 8   # 迁移下载默认并发数
+DOWNLOAD_PER_HOST = 4   # 同一主机最多同时连接数
+DOWNLOAD_MAX_MB   = 50  # 单个远程图片大小上限
+DOWNLOAD_CHUNK    = 64 * 1024
+DOWNLOAD_TYPES    = ('image/', 'application/octet-stream')  # Content-Type 前缀白名单
+DOWNLOAD_CACHE_NAME = ".download_cache.json"  # 目标目录下的下载缓存文件名
+
+
+class RemoteFetcher:
+    """远程图片下载器：共享连接池 Session（keep-alive）+ 有界线程池 + 单主机并发上限。
+
+    响应体按块流式写入临时文件，超过 max_bytes 或 Content-Type 不在白名单内时提前中止。
+    """
+    def __init__(self, workers=DOWNLOAD_WORKERS, per_host=DOWNLOAD_PER_HOST, timeout=10, cancel=None,
+                 max_mb=DOWNLOAD_MAX_MB, types=DOWNLOAD_TYPES):
+        self.workers = max(1, int(workers))
+        self.per_host = max(1, int(per_host))
+        self.timeout = timeout
+        self.max_bytes = int(max_mb * 1024 * 1024) if max_mb else 0   # 0 = 不限
+        self.types = tuple(t.lower() for t in types) if types else ()  # 空 = 不限
+        self._cancel = cancel or threading.Event()
+        self._lock = threading.Lock()
+        self._host_slots = {}
+        self._pool = None
+        import requests   # 延迟导入：只审计/重命名时不付出 requests 的导入开销
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.per_host)
+        self.session.mount('http://', adapter); self.session.mount('https://', adapter)
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+    def close(self):
+        if self._pool: self._pool.shutdown(cancel_futures=True)
+        self.session.close()
+
+    def host_slot(self, url):
+        """返回该 URL 主机的并发信号量，用 with 包住整个请求（含读取响应体）"""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            s = self._host_slots.get(host)
+            if s is None:
+                s = self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+        return s
+
+    def get(self, url, **kw):
+        return self.session.get(url, timeout=self.timeout, **kw)
+
+    def submit(self, fn, *args):
+        """把 fn(*args) 交给下载线程池（首次调用时创建），返回 Future；取消后未开始的任务结果为 None"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="md-fetch")
+        return self._pool.submit(lambda: None if self._cancel.is_set() else fn(*args))
+
+    def fetch_to_temp(self, url, tdir, headers=None):
+        """流式下载到 tdir 下的临时文件，返回 (临时文件路径, 响应头, sha1)；不合规时抛 ValueError。
+
+        headers 可带 If-None-Match / If-Modified-Since；服务器返回 304 时临时文件路径为 None。
+        """
+        with self.host_slot(url), self.get(url, stream=True, headers=headers) as r:
+            if r.status_code == 304: return None, r.headers, ""
+            r.raise_for_status()
+            ctype = r.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if ctype and self.types and not ctype.startswith(self.types):
+                raise ValueError(f"非图片类型 {ctype}")
+            clen = r.headers.get('Content-Length', '')
+            if self.max_bytes and clen.isdigit() and int(clen) > self.max_bytes:
+                raise ValueError(f"文件过大 ({int(clen) // 1024} KB)")
+            os.makedirs(tdir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=tdir, suffix='.part')
+            try:
+                size, h = 0, hashlib.sha1()
+                with os.fdopen(fd, 'wb') as wf:
+                    for chunk in r.iter_content(DOWNLOAD_CHUNK):
+                        if self._cancel.is_set(): raise ValueError("已取消")
+                        size += len(chunk)
+                        if self.max_bytes and size > self.max_bytes:
+                            raise ValueError(f"文件超过 {self.max_bytes // 1024 // 1024} MB")
+                        wf.write(chunk); h.update(chunk)
+            except BaseException:
+                if os.path.exists(tmp): os.remove(tmp)
+                raise
+            return tmp, r.headers, h.hexdigest()
+
+
+class DownloadCache:
+    """URL -> 已下载文件 的持久缓存（JSON），记录 ETag / Last-Modified / sha1 / 过期时间。
+
+    文件仍在且大小、mtime 未变时条目才有效；未过期直接复用，过期则发条件请求。
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def lookup(self, url):
+        e = self.entries.get(url)
+        if not e: return None
+        try:
+            st = os.stat(e['path'])
+        except OSError:
+            return None
+        if st.st_size != e.get('size') or st.st_mtime_ns != e.get('mtime_ns'): return None
+        return e
+
+    @staticmethod
+    def is_fresh(e): return e.get('expires', 0) > time.time()
+
+    @staticmethod
+    def validators(e):
+        h = {}
+        if e.get('etag'): h['If-None-Match'] = e['etag']
+        if e.get('last_modified'): h['If-Modified-Since'] = e['last_modified']
+        return h
+
+    @staticmethod
+    def _expires(headers):
+        cc = headers.get('Cache-Control', '').lower()
+        if 'no-cache' in cc or 'no-store' in cc: return 0
+        m = re.search(r'max-age=(\d+)', cc)
+        return time.time() + int(m.group(1)) if m else 0
+
+    def store(self, url, path, headers, sha1):
+        st = os.stat(path)
+        with self._lock:
+            self.entries[url] = {
+                "path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                "sha1": sha1, "etag": headers.get('ETag', ''),
+                "last_modified": headers.get('Last-Modified', ''), "expires": self._expires(headers),
+            }
+
+    def refresh(self, url, headers):
+        """收到 304 后更新过期时间与校验头"""
+        with self._lock:
+            e = self.entries.get(url)
+            if not e: return
+            e['expires'] = self._expires(headers)
+            if headers.get('ETag'): e['etag'] = headers['ETag']
+            if headers.get('Last-Modified'): e['last_modified'] = headers['Last-Modified']
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.entries, ensure_ascii=False)
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f: f.write(data)
+        os.replace(tmp, self.path)
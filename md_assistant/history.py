@@ -0,0 +1,116 @@
+"""持久化撤销历史：重命名、原地整理每执行一次记一批，跨重启保留，深度不限。
+
+文件为 JSON Lines，每行一批，撤销时从文件尾部弹出（截断）；路径相对批次的 root 存储：
+    {"k": 类型, "t": 时间戳, "root": 目录,
+     "mv": [[现路径, 原路径], ...],          按执行顺序
+     "ln": {MD 路径: {新链接: 原链接}},      需要改回的图片链接
+     "lk": {MD 路径: {新目标: 原目标}}}      需要改回的 [文字](目标) 链接（重命名同步链接时）
+"""
+import os
+import json
+import time
+import threading
+
+UNDO_LOG_PATH = os.path.join(os.path.expanduser("~"), ".md_assistant", "undo.jsonl")
+
+
+class UndoBatch:
+    """执行中的一批可撤销操作；多线程记录安全"""
+
+    def __init__(self, kind, root):
+        self.kind, self.root = kind, os.path.abspath(root)
+        self.moves, self.links = [], {}
+        self._lock = threading.Lock()
+
+    def _rel(self, p): return os.path.relpath(os.path.abspath(p), self.root)
+
+    def moved(self, src, dst):
+        with self._lock:
+            self.moves.append([self._rel(dst), self._rel(src)])
+
+    def relinked(self, note, mapping, key='ln'):
+        """mapping 为本次改写 {原链接: 新链接}；key 为 'ln'（图片）或 'lk'（笔记间链接）"""
+        if not mapping: return
+        with self._lock:
+            self.links.setdefault(key, {}).setdefault(self._rel(note), {}).update({v: k for k, v in mapping.items()})
+
+    def __bool__(self): return bool(self.moves or self.links)
+
+    def to_dict(self):
+        d = {'k': self.kind, 't': int(time.time()), 'root': self.root, 'mv': self.moves}
+        d.update(self.links)
+        return d
+
+
+class UndoLog:
+    """撤销栈；path 为 None 时仅保存在内存中"""
+
+    def __init__(self, path=UNDO_LOG_PATH):
+        self.path = path
+        self._mem = []
+        self._offsets, self._size = [], 0   # 每批在文件中的起始偏移 / 有效长度
+        self._lock = threading.Lock()
+        self._sync()
+
+    def _sync(self):
+        """文件被其他进程（如命令行）改过时重建偏移；末尾写了一半的行直接截掉"""
+        if not self.path: return
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            self._offsets, self._size = [], 0
+            return
+        if size == self._size and (self._offsets or not size): return
+        self._offsets, pos = [], 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"): break
+                self._offsets.append(pos)
+                pos += len(line)
+        self._size = pos
+        if size != pos:
+            with open(self.path, 'r+b') as f: f.truncate(pos)
+
+    def __len__(self):
+        if not self.path: return len(self._mem)
+        with self._lock:
+            self._sync()
+            return len(self._offsets)
+
+    def push(self, batch):
+        if not batch: return
+        d = batch.to_dict()
+        with self._lock:
+            self._sync()
+            self._append(d)
+
+    def _append(self, d):
+        if not self.path:
+            self._mem.append(d); return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        line = (json.dumps(d, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+        with open(self.path, 'ab') as f:
+            f.write(line)
+        self._offsets.append(self._size)
+        self._size += len(line)
+
+    def peek(self):
+        with self._lock:
+            if not self.path: return self._mem[-1] if self._mem else None
+            self._sync()
+            if not self._offsets: return None
+            with open(self.path, 'rb') as f:
+                f.seek(self._offsets[-1])
+                return json.loads(f.readline())
+
+    def pop(self, rest=None):
+        """弹出最近一批；rest 不为空时换成 rest（只撤销了一部分时保留剩下的，可再次撤销）"""
+        with self._lock:
+            if not self.path:
+                if self._mem: self._mem.pop()
+            else:
+                self._sync()
+                if not self._offsets: return
+                self._size = self._offsets.pop()
+                with open(self.path, 'r+b') as f: f.truncate(self._size)
+            if rest: self._append(rest)
@@ -0,0 +1,298 @@
+"""目录树与本地图片索引：审计用的单遍目录扫描与增量缓存、迁移用的内容寻址去重、重命名用的反向链接索引、
+以及分配不重名文件名的内存名册。"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import quote, unquote
+
+from .refs import outside_code
+
+IMG_EXTS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.bmp', '.tiff', '.ico'}
+AUDIT_CACHE_NAME = ".md_audit_cache.json"   # 增量审计缓存，位于扫描根目录
+AUDIT_CACHE_VERSION = 2   # 引用提取规则变化时递增（2：refs.py 的代码块感知提取）
+LINK_PATTERN = r'(?<!!)\[[^\]\n]*\]\(\s*(<[^>\n]+>|[^)\s]+)'   # [文字](目标)，不含图片；目标可用 <> 包裹
+
+
+class ImageTreeIndex:
+    """一次 os.scandir 遍历建立的目录树索引：目录 -> 图片、目录 -> 子目录、全部 MD 文件。
+
+    子目录关系中剪除 unused_backup（与原先逐文件 os.walk 的剪枝一致），
+    但仍会进入其中收集 MD，因此批量/单文件审计结果与逐文件遍历完全相同。
+    传入 AuditCache 时，mtime 未变的目录直接复用上次的列表而不再 scandir，并在 snapshot 中记录本次结果。
+    """
+    def __init__(self, root, cache=None):
+        self.root = root
+        self.images = {}     # dir -> [img_abs]
+        self.children = {}   # dir -> [subdir]（不含 unused_backup）
+        self.mds = []
+        self._cache = cache
+        self.snapshot = {} if cache is not None else None   # dir -> [mtime_ns, 子目录名, 图片名, MD 名]
+        self.reused = 0
+        self._build()
+
+    @staticmethod
+    def _list(d):
+        """scandir 一个目录，返回 (子目录名, 图片名, MD 名)；不可读返回 None"""
+        try:
+            with os.scandir(d) as it:
+                entries = list(it)
+        except OSError:
+            return None
+        subs, imgs, mds = [], [], []
+        for e in entries:
+            try:
+                is_dir = e.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # 与 os.walk(followlinks=False) 一致：目录链接不递归
+                if not e.is_symlink(): subs.append(e.name)
+                continue
+            if e.name.endswith('.md'): mds.append(e.name)
+            if os.path.splitext(e.name)[1].lower() in IMG_EXTS: imgs.append(e.name)
+        return subs, imgs, mds
+
+    def _build(self):
+        stack = [self.root]
+        while stack:
+            d = stack.pop()
+            if self._cache is None:
+                listing = self._list(d)
+            else:
+                try:
+                    mt = os.stat(d).st_mtime_ns
+                except OSError:
+                    continue
+                listing = self._cache.dir_listing(d, mt)
+                if listing is not None: self.reused += 1
+                else: listing = self._list(d)
+                if listing is not None: self.snapshot[d] = [mt, *listing]
+            if listing is None: continue
+            sub_names, img_names, md_names = listing
+            subs = []
+            for n in sub_names:
+                sp = os.path.join(d, n)
+                stack.append(sp)
+                if n != 'unused_backup': subs.append(sp)
+            self.mds.extend(os.path.join(d, n) for n in md_names)
+            if subs: self.children[d] = subs
+            if img_names: self.images[d] = [os.path.normpath(os.path.join(d, n)) for n in img_names]
+
+    def images_under(self, dirs):
+        """返回 dirs 中各目录子树内全部图片的并集，每个目录至多访问一次"""
+        out, seen = set(), set()
+        stack = list(dirs)
+        while stack:
+            d = stack.pop()
+            if d in seen: continue
+            seen.add(d)
+            out.update(self.images.get(d, ()))
+            stack.extend(self.children.get(d, ()))
+        return out
+
+
+class AuditCache:
+    """增量审计缓存：扫描根目录下的 JSON 文件，保存目录列表快照与每个 MD 的 mtime/size/引用。
+
+    与 git 的 racy 处理相同，mtime 距上次扫描不足 RACY_NS 的条目不予信任，避免同一时间粒度内的修改被漏掉。
+    """
+    RACY_NS = 2 * 10**9
+
+    def __init__(self, root):
+        self.path = os.path.join(root, AUDIT_CACHE_NAME)
+        self.dirs, self.notes = {}, {}
+        self.scanned_ns = 0
+        self._stats = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == AUDIT_CACHE_VERSION:
+                self.dirs, self.notes = data['dirs'], data['notes']
+                self.scanned_ns = data['scanned_ns']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        self._started_ns = time.time_ns()
+
+    def _trusted(self, mtime_ns): return mtime_ns < self.scanned_ns - self.RACY_NS
+
+    def dir_listing(self, d, mtime_ns):
+        e = self.dirs.get(d)
+        if e and e[0] == mtime_ns and self._trusted(mtime_ns): return e[1], e[2], e[3]
+        return None
+
+    def split_notes(self, mds):
+        """按 mtime/size 把 MD 分为 ({未变 MD: 引用列表}, [需重新解析的 MD])"""
+        known, todo = {}, []
+        for m in mds:
+            try:
+                st = os.stat(m)
+            except OSError:
+                todo.append(m); continue
+            self._stats[m] = (st.st_mtime_ns, st.st_size)
+            e = self.notes.get(m)
+            if e and e[0] == st.st_mtime_ns and e[1] == st.st_size and self._trusted(st.st_mtime_ns):
+                known[m] = e[2]
+            else:
+                todo.append(m)
+        return known, todo
+
+    def save(self, snapshot, refs_by_note):
+        notes = {m: [*self._stats[m], sorted(r)] for m, r in refs_by_note.items() if m in self._stats}
+        data = {"version": AUDIT_CACHE_VERSION,
+                "scanned_ns": self._started_ns, "dirs": snapshot, "notes": notes}
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp, self.path)
+
+
+class LocalBlobIndex:
+    """迁移时本地图片的内容寻址索引：同一源文件或内容相同的文件只复制一次。
+
+    先按真实路径命中；否则按文件大小预筛，只有出现同尺寸候选时才计算 blake2b 哈希。
+    登记的“副本”可以是路径，也可以是尚未完成的复制任务（Future），由调用方在使用前取结果。
+    """
+    def __init__(self):
+        self.by_src = {}    # realpath(src) -> 副本路径
+        self.by_size = {}   # size -> [尚未计算哈希的 realpath(src)]
+        self.by_hash = {}   # (size, digest) -> 副本路径
+        self.hashed_sizes = set()
+        self.hits = 0
+
+    @staticmethod
+    def _digest(path):
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _flush_size(self, size):
+        """把该尺寸下尚未哈希的已复制文件补算哈希"""
+        for rp in self.by_size.pop(size, ()):
+            self.by_hash.setdefault((size, self._digest(rp)), self.by_src[rp])
+        self.hashed_sizes.add(size)
+
+    def lookup(self, src):
+        """返回已存在的相同内容副本路径，没有则返回 None"""
+        rp = os.path.realpath(src)
+        p = self.by_src.get(rp)
+        if p is None:
+            size = os.path.getsize(rp)
+            if size not in self.by_size and size not in self.hashed_sizes:
+                return None
+            self._flush_size(size)
+            p = self.by_hash.get((size, self._digest(rp)))
+            if p is None: return None
+            self.by_src[rp] = p
+        self.hits += 1
+        return p
+
+    def add(self, src, copied):
+        rp = os.path.realpath(src)
+        self.by_src[rp] = copied
+        size = os.path.getsize(rp)
+        if size in self.hashed_sizes:
+            self.by_hash.setdefault((size, self._digest(rp)), copied)
+        else:
+            self.by_size.setdefault(size, []).append(rp)
+
+
+def link_path(raw):
+    """链接目标 -> 解码后的文件路径部分（去掉 <>、#锚点、?参数）"""
+    if raw.startswith('<'): raw = raw[1:-1]
+    return unquote(re.split(r'[#?]', raw, 1)[0])
+
+
+def relink(raw, new_name):
+    """把链接目标的文件名换成 new_name，保留目录部分、锚点与 <> / %20 等原有写法"""
+    inner = raw[1:-1] if raw.startswith('<') else raw
+    m = re.match(r'[^#?]*', inner)
+    path, rest = m.group(0), inner[m.end():]
+    base = path[path.rfind('/') + 1:]
+    name = quote(new_name) if base != unquote(base) else new_name
+    new = path[:len(path) - len(base)] + name + rest
+    return f"<{new}>" if raw.startswith('<') else new
+
+
+class LinkIndex:
+    """反向链接索引：一次遍历 root 下全部 MD，记录哪些笔记链接到 targets 中的文件。
+
+    by_target: 被链接文件的 normpath 绝对路径 -> {链接它的 MD 绝对路径}。
+    只解析文件名命中 targets 的链接，大库中也只需读一遍每个 MD。
+    """
+    def __init__(self, root, targets):
+        self.by_target = {}
+        self.scanned = 0
+        root = os.path.abspath(root)
+        targets = {os.path.normpath(os.path.abspath(t)) for t in targets}
+        names = {os.path.basename(t) for t in targets}
+        link_re = re.compile(LINK_PATTERN)
+        for r, ds, fs in os.walk(root):
+            ds[:] = [d for d in ds if d not in ('images', 'unused_backup') and not d.startswith('.')]
+            for f in fs:
+                if not f.endswith('.md'): continue
+                fp = os.path.join(r, f)
+                try:
+                    with open(fp, 'r', encoding='utf-8', errors='ignore') as fh:
+                        txt = fh.read()
+                except OSError:
+                    continue
+                self.scanned += 1
+                if '](' not in txt: continue
+                for m in outside_code(link_re, txt):   # 代码中的示例链接不算
+                    p = link_path(m.group(1))
+                    if os.path.basename(p) not in names: continue
+                    t = os.path.normpath(os.path.join(r, p))
+                    if t in targets: self.by_target.setdefault(t, set()).add(os.path.normpath(os.path.abspath(fp)))
+
+    def linking(self, paths):
+        """链接到 paths 中任一文件的笔记集合"""
+        out = set()
+        for p in paths: out |= self.by_target.get(os.path.normpath(os.path.abspath(p)), set())
+        return out
+
+
+class NameRegistry:
+    """按目录登记已占用的文件名：每个目录只 listdir 一次，之后在内存中分配 name、name_1、name_2…
+
+    同一批次内分配过的名字同样视为占用；同名文件很多时按 (目录, 主名, 扩展名) 记住下一个序号，
+    不必从 _1 重新试起。名字按 os.path.normcase 比较（Windows 不区分大小写）。线程安全。
+    """
+    def __init__(self):
+        self._dirs = {}
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def _names(self, d):
+        names = self._dirs.get(d)
+        if names is None:
+            try:
+                names = {os.path.normcase(n) for n in os.listdir(d)}
+            except OSError:
+                names = set()
+            self._dirs[d] = names
+        return names
+
+    def reserve(self, d, filename):
+        """返回 d 下未被占用的路径并登记"""
+        with self._lock:
+            names = self._names(d)
+            if os.path.normcase(filename) not in names:
+                names.add(os.path.normcase(filename))
+                return os.path.join(d, filename)
+            base, ext = os.path.splitext(filename)
+            key = (d, os.path.normcase(base), ext)
+            i = self._next.get(key, 1)
+            while os.path.normcase(f"{base}_{i}{ext}") in names: i += 1
+            self._next[key] = i + 1
+            names.add(os.path.normcase(f"{base}_{i}{ext}"))
+            return os.path.join(d, f"{base}_{i}{ext}")
+
+    def release(self, d, filename):
+        """filename 即将从 d 移走，之后可被重新分配"""
+        with self._lock:
+            self._names(d).discard(os.path.normcase(filename))
@@ -0,0 +1,349 @@
+"""改动磁盘的操作（迁移、原地整理、清理）的追加式操作日志，以及 MD 的原子写入。
+
+每个动作先把意图追加到 <根目录>/.md_journal/journal.jsonl，再真正执行；
+操作正常结束后整个日志目录被删除。进程崩溃后日志留在原处，
+可用 recover() 回滚到操作前的状态，或把已记录的动作补做完（replay）。
+
+记录类型：
+    begin   {kind}                      操作开始
+    move    {src, dst, unit}            移动文件
+    create  {path}                      新建文件（回滚时删除）
+    write   {path, tmp, bak, unit}      tmp 原子替换 path；bak 为旧内容的硬链接，原本不存在时为 null
+    delete  {path, trash}               删除 = 先移入日志目录的 trash/，提交时随日志一起清除
+    end                                 操作完成
+
+路径一律相对日志所在的根目录记录（不同盘符等无法相对时记绝对路径），
+因此无论从哪个工作目录恢复都能找到原文件。
+每条记录只 flush 不 fsync（begin/end 时 fsync），开销为每个文件一行 JSON 加一次硬链接。
+
+进行中的操作锁住日志目录中的 owner.lock（内容为进程号，仅供查看）。锁随进程退出由系统释放，
+所以日志还在而锁无人持有即是崩溃留下的；pending() / recover() 遇到仍被持有的日志时拒绝处理。
+"""
+import os
+import json
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+JOURNAL_DIR = ".md_journal"
+_LOG_NAME = "journal.jsonl"
+_OWNER_NAME = "owner.lock"
+
+
+class JournalPending(RuntimeError):
+    """目录中留有未完成的操作日志，需先 recover()"""
+
+
+class RecoveryIncomplete(RuntimeError):
+    """恢复时有动作找不到记录的文件或执行失败；日志与备份保留在原处，可处理后重试"""
+
+
+def atomic_write(path, text):
+    """先写同目录临时文件再 os.replace，读者不会看到写了一半的 MD"""
+    tmp = path + ".mdtmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def pending(root):
+    """root 下有中断留下的操作日志时返回其操作类型，否则返回 None；
+    日志属于仍在进行的操作时抛出 JournalPending"""
+    p = os.path.join(root, JOURNAL_DIR, _LOG_NAME)
+    if not os.path.exists(p): return None
+    if held(root): raise JournalPending(_busy(root))
+    recs = _read(p)
+    return recs[0].get('kind', '?') if recs else '?'
+
+
+def held(root):
+    """root 下的操作日志是否属于仍在进行的操作"""
+    d = os.path.join(root, JOURNAL_DIR)
+    if not os.path.exists(os.path.join(d, _LOG_NAME)): return False
+    try:
+        owner = _hold(d)
+    except FileNotFoundError:   # 日志目录刚被删除
+        return False
+    if owner is None: return True
+    _release(owner)
+    return False
+
+
+def _busy(root): return f"{root} 中的操作正在进行，请等待其结束"
+
+
+def _hold(d):
+    """锁住 d 中的 owner.lock 并返回该文件；已被进行中的操作（本进程或其他进程）持有时返回 None"""
+    f = open(os.path.join(d, _OWNER_NAME), 'a+')
+    try:
+        if fcntl: fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else: f.seek(0); msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _release(owner):
+    if not fcntl: owner.seek(0); msvcrt.locking(owner.fileno(), msvcrt.LK_UNLCK, 1)
+    owner.close()
+
+
+def _remove(d, owner):
+    """删除日志目录：先在持锁时删掉其余内容，最后释放并删除 owner.lock，删除途中不会有新操作开始"""
+    for e in os.scandir(d):
+        if e.name == _OWNER_NAME: continue
+        if e.is_dir(follow_symlinks=False): shutil.rmtree(e.path, ignore_errors=True)
+        else:
+            try: os.remove(e.path)
+            except OSError: pass
+    _release(owner)
+    try:
+        os.remove(os.path.join(d, _OWNER_NAME)); os.rmdir(d)
+    except OSError:   # 新的操作已经打开了它
+        pass
+
+
+def _read(path):
+    recs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                recs.append(json.loads(line))
+            except ValueError:
+                break   # 崩溃时最后一行可能只写了一半
+    return recs
+
+
+class Journal:
+    """一次操作的日志；with 块正常退出时提交，异常退出时保留日志等待恢复"""
+
+    def __init__(self, root, kind):
+        self.root = os.path.abspath(root)
+        self.dir = os.path.join(self.root, JOURNAL_DIR)
+        os.makedirs(self.dir, exist_ok=True)
+        self._owner = _hold(self.dir)
+        if self._owner is None: raise JournalPending(_busy(root))
+        try:
+            self._f = open(os.path.join(self.dir, _LOG_NAME), 'x', encoding='utf-8')   # 检查与创建为同一步
+        except FileExistsError:
+            _release(self._owner)
+            raise JournalPending(f"{root} 中有未完成的操作记录（{JOURNAL_DIR}），请先恢复或回滚") from None
+        self._owner.seek(0); self._owner.truncate()
+        self._owner.write(str(os.getpid())); self._owner.flush()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._append({'t': 'begin', 'kind': kind}, sync=True)
+
+    def _append(self, rec, sync=False):
+        self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._f.flush()
+        if sync: os.fsync(self._f.fileno())
+
+    def _rel(self, p):
+        """记录用路径：相对根目录；无法相对（如不同盘符）时为绝对路径"""
+        p = os.path.abspath(p)
+        try:
+            return os.path.relpath(p, self.root)
+        except ValueError:
+            return p
+
+    def _slot(self, sub, name=""):
+        with self._lock:
+            self._seq += 1
+            n = self._seq
+        d = os.path.join(self.dir, sub)
+        os.makedirs(d, exist_ok=True)
+        return os.path.join(d, f"{n}_{name}" if name else str(n))
+
+    def move(self, src, dst, unit=None):
+        with self._lock:
+            self._append({'t': 'move', 'src': self._rel(src), 'dst': self._rel(dst), 'unit': unit})
+        shutil.move(src, dst)
+
+    def create(self, path):
+        """path 即将由调用方新建"""
+        with self._lock:
+            self._append({'t': 'create', 'path': self._rel(path)})
+
+    def write_text(self, path, text, unit=None):
+        tmp = path + ".mdtmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        self.replace(tmp, path, unit)
+
+    def replace(self, tmp, path, unit=None):
+        """把已写好的 tmp 原子替换为 path，并保留 path 原内容以便回滚"""
+        bak = self._slot("bak") if os.path.exists(path) else None
+        with self._lock:
+            self._append({'t': 'write', 'path': self._rel(path), 'tmp': self._rel(tmp),
+                          'bak': bak and self._rel(bak), 'unit': unit})
+        if bak:
+            try:
+                os.link(path, bak)
+            except OSError:   # 文件系统不支持硬链接
+                shutil.copy2(path, bak)
+        os.replace(tmp, path)
+
+    def delete(self, path):
+        trash = self._slot("trash", os.path.basename(path))
+        with self._lock:
+            self._append({'t': 'delete', 'path': self._rel(path), 'trash': self._rel(trash)})
+        shutil.move(path, trash)
+
+    def commit(self):
+        self._append({'t': 'end'}, sync=True)
+        self._f.close()
+        _remove(self.dir, self._owner)
+
+    def rollback(self, log=None):
+        """撤销本次已执行的动作并删除日志，返回撤销的动作数；有动作无法撤销时抛出 RecoveryIncomplete，日志保留"""
+        self._f.close()
+        try:
+            _, n = _apply(self.root, False, log)
+        except BaseException:
+            _release(self._owner)
+            raise
+        _remove(self.dir, self._owner)
+        return n
+
+    def close(self):
+        """保留日志等待恢复，并释放占用"""
+        if not self._f.closed: self._f.close()
+        if not self._owner.closed: _release(self._owner)
+
+    def __enter__(self): return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None: self.commit()
+        else: self.close()
+
+
+def recover(root, replay=False, log=None):
+    """处理 root 下未完成的操作日志，返回 (操作类型, 处理的动作数)；没有日志时返回 (None, 0)。
+
+    replay=False：按相反顺序撤销全部已执行的动作，恢复到操作前。
+    replay=True ：补做已记录但未执行完的动作；原地整理中图片已移走、MD 尚未改写的文档，
+                  其移动会被撤销，保证不留下指向已移走图片的链接。
+    有动作找不到记录的文件或执行失败时抛出 RecoveryIncomplete，日志与备份不删除，其余动作照常处理。
+    日志属于仍在进行的操作时抛出 JournalPending，不做任何处理。
+    """
+    root = os.path.abspath(root)
+    d = os.path.join(root, JOURNAL_DIR)
+    if not os.path.exists(os.path.join(d, _LOG_NAME)): return None, 0
+    owner = _hold(d)
+    if owner is None: raise JournalPending(_busy(root))
+    try:
+        kind, n = _apply(root, replay, log)
+    except BaseException:
+        _release(owner)
+        raise
+    _remove(d, owner)
+    return kind, n
+
+
+def _apply(root, replay, log):
+    """按日志回滚或补做，返回 (操作类型, 处理的动作数)；不删除日志"""
+    path = os.path.join(root, JOURNAL_DIR, _LOG_NAME)
+    log = log or (lambda m: None)
+    recs = [_resolve(r, root) for r in _read(path)]
+    kind = recs[0].get('kind', '?') if recs else '?'
+    if recs and recs[-1].get('t') == 'end':   # 已提交，只是没来得及删除日志目录
+        return kind, 0
+    n, failed = 0, []
+
+    def run(fn, r):
+        nonlocal n
+        try:
+            done = fn(r, log)
+        except OSError as e:
+            done = e
+        if done is True: n += 1
+        elif done is not False:
+            failed.append(r)
+            log(f" [失败] {r['t']} {r.get('path') or r.get('src')}：{done or '找不到记录的文件'}")
+
+    if replay:
+        written = {r.get('unit') for r in recs if r['t'] == 'write'}
+        orphan = [r for r in recs if r['t'] == 'move' and r.get('unit') and r['unit'] not in written]
+        for r in reversed(orphan): run(_undo, r)
+        skip = {id(r) for r in orphan}
+        for r in recs:
+            if id(r) not in skip: run(_redo, r)
+    else:
+        for r in reversed(recs): run(_undo, r)
+    if failed:
+        raise RecoveryIncomplete(f"{len(failed)} 项无法{'补做' if replay else '回滚'}（已处理 {n} 项），"
+                                 f"日志与备份保留在 {os.path.dirname(path)}")
+    return kind, n
+
+
+def _resolve(r, root):
+    """记录中的相对路径还原为绝对路径"""
+    r = dict(r)
+    for k in ('src', 'dst', 'path', 'tmp', 'bak', 'trash'):
+        if r.get(k): r[k] = os.path.normpath(os.path.join(root, r[k]))
+    return r
+
+
+# _undo / _redo 返回 True 表示执行了动作，False 表示无需执行（尚未发生或已处理过），
+# None 表示记录涉及的文件都不在，无法判断也无法处理
+def _undo(r, log):
+    t = r['t']
+    if t == 'move':
+        src, dst = os.path.exists(r['src']), os.path.exists(r['dst'])
+        if dst and not src:
+            os.makedirs(os.path.dirname(r['src']), exist_ok=True)
+            shutil.move(r['dst'], r['src']); log(f" [回滚] {os.path.basename(r['dst'])} -> {r['src']}")
+            return True
+        return False if src else None
+    if t == 'create':
+        if os.path.exists(r['path']):
+            os.remove(r['path']); log(f" [回滚] 删除 {r['path']}")
+            return True
+        return False
+    if t == 'write':
+        if os.path.exists(r['tmp']):   # 尚未替换，原文件完好
+            os.remove(r['tmp'])
+            return False
+        if r['bak']:
+            if not os.path.exists(r['bak']): return None
+            os.replace(r['bak'], r['path']); log(f" [回滚] 还原 {r['path']}")
+            return True
+        if os.path.exists(r['path']):
+            os.remove(r['path']); log(f" [回滚] 删除 {r['path']}")
+            return True
+        return False
+    if t == 'delete':
+        trash, there = os.path.exists(r['trash']), os.path.exists(r['path'])
+        if trash and not there:
+            shutil.move(r['trash'], r['path']); log(f" [回滚] 恢复 {r['path']}")
+            return True
+        return False if there else None
+    return False
+
+
+def _redo(r, log):
+    t = r['t']
+    if t == 'move':
+        src, dst = os.path.exists(r['src']), os.path.exists(r['dst'])
+        if src and not dst:
+            shutil.move(r['src'], r['dst']); log(f" [补做] {os.path.basename(r['src'])} -> {r['dst']}")
+            return True
+        return False if dst else None
+    if t == 'write':
+        if os.path.exists(r['tmp']):
+            os.replace(r['tmp'], r['path']); log(f" [补做] 写入 {r['path']}")
+            return True
+        return False if os.path.exists(r['path']) else None
+    if t == 'delete':
+        if os.path.exists(r['path']):
+            os.remove(r['path']); log(f" [补做] 删除 {r['path']}")
+            return True
+        return False
+    return False
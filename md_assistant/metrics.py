@@ -0,0 +1,126 @@
+"""运行统计：每次操作一份计数器、计时器与下载耗时分布，结束时汇总为文字报告或 JSON。
+
+计数与计时可在多个线程中同时记录；计时器为各线程累计时间，并行阶段的合计可能超过总耗时。
+进程池中的解析结果以 snapshot() 传回主进程后 merge()。
+"""
+import io
+import time
+import threading
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)   # 下载耗时分布的桶上限（秒），最后一桶为更慢
+PROFILE_TOP = 25   # 报告中列出的累计耗时最多的函数数
+
+# 报告中的名称；未列出的按原名显示
+_LABELS = {
+    "md_files": "MD 文件", "dirs": "目录", "stat": "stat 调用",
+    "read_files": "读取文件", "read_bytes": "读取字节", "write_files": "写入文件", "write_bytes": "写入字节",
+    "copies": "复制图片", "moves": "移动文件", "refs": "图片引用",
+    "downloads": "下载", "download_bytes": "下载字节", "download_failed": "下载失败",
+    "cache_hits": "下载缓存命中", "not_modified": "缓存验证未修改", "dedupe_hits": "本地去重命中",
+    "audit_cache_hits": "审计缓存复用 MD", "audit_cache_dirs": "审计缓存复用目录", "relinked": "改写链接的笔记",
+    "walk": "遍历", "read": "读取", "parse": "解析引用", "copy": "复制", "download": "下载", "write": "写出",
+    "links": "链接索引",
+}
+# 操作类型的显示名称
+KIND_NAMES = {"audit": "审计", "migrate": "迁移", "inplace": "原地整理", "rename": "重命名",
+              "undo": "撤销", "cleanup": "清理", "watch": "监视"}
+
+
+def _size(n):
+    for unit in ("B", "KB", "MB"):
+        if n < 1024: return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+class RunStats:
+    """一次操作的统计；kind 为操作类型（audit / migrate / inplace / rename …）"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.started = time.time()
+        self.elapsed = None
+        self.counters = {}   # 名称 -> 次数 / 字节数
+        self.timers = {}     # 名称 -> [调用次数, 累计秒数]
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.profile = None  # 开启性能分析时为累计耗时最多的函数列表（文本）
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for k, n in counts.items(): self.counters[k] = self.counters.get(k, 0) + n
+
+    def add_time(self, name, seconds, calls=1):
+        with self._lock:
+            t = self.timers.setdefault(name, [0, 0.0])
+            t[0] += calls; t[1] += seconds
+
+    @contextmanager
+    def timed(self, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t)
+
+    def download(self, seconds, nbytes=0, ok=True):
+        """记录一次下载：计入耗时分布与 download 计时器"""
+        i = next((k for k, b in enumerate(LATENCY_BUCKETS) if seconds <= b), len(LATENCY_BUCKETS))
+        with self._lock:
+            self.latency[i] += 1
+        self.add_time("download", seconds)
+        if ok: self.add(downloads=1, download_bytes=nbytes)
+        else: self.add(download_failed=1)
+
+    def snapshot(self):
+        """可跨进程传递的计数与计时"""
+        with self._lock:
+            return {"counters": dict(self.counters), "timers": {k: list(v) for k, v in self.timers.items()}}
+
+    def merge(self, snap):
+        self.add(**snap["counters"])
+        for k, (calls, secs) in snap["timers"].items(): self.add_time(k, secs, calls)
+
+    def attach_profile(self, prof, path=None):
+        """收下 cProfile.Profile 的结果；path 不为空时另存为 .prof 文件（可用 snakeviz 等查看）"""
+        import pstats   # 只在开启性能分析时用到
+        if path: prof.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        self.profile = out.getvalue()
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self._t0
+
+    # --- 输出 ---
+    def to_dict(self):
+        with self._lock:
+            d = {
+                "kind": self.kind,
+                "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+                "elapsed": round(self.elapsed if self.elapsed is not None else time.perf_counter() - self._t0, 4),
+                "counters": dict(self.counters),
+                "timers": {k: {"calls": c, "seconds": round(s, 4)} for k, (c, s) in self.timers.items()},
+            }
+            if any(self.latency):
+                d["download_latency"] = {f"<={b}s": n for b, n in zip(LATENCY_BUCKETS, self.latency)}
+                d["download_latency"][f">{LATENCY_BUCKETS[-1]}s"] = self.latency[-1]
+        if self.profile: d["profile"] = self.profile
+        return d
+
+    def summary(self):
+        """多行文字报告，供日志窗口与命令行显示"""
+        d = self.to_dict()
+        lines = [f"=== {KIND_NAMES.get(self.kind, self.kind)}统计：总耗时 {d['elapsed']:.2f}s ==="]
+        if d["counters"]:
+            lines.append("  " + " · ".join(f"{_LABELS.get(k, k)} {_size(n) if k.endswith('_bytes') else n}"
+                                           for k, n in d["counters"].items()))
+        for k, t in sorted(d["timers"].items(), key=lambda x: -x[1]["seconds"]):
+            avg = t["seconds"] / t["calls"] * 1000 if t["calls"] else 0
+            lines.append(f"  {_LABELS.get(k, k)}：{t['seconds']:.3f}s / {t['calls']} 次（平均 {avg:.2f} ms）")
+        if "download_latency" in d:
+            lines.append("  下载耗时分布：" + "  ".join(f"{b} {n}" for b, n in d["download_latency"].items() if n))
+        if self.profile: lines.append("  已记录性能分析（cProfile），见导出的 JSON")
+        return "\n".join(lines)
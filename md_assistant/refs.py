@@ -0,0 +1,255 @@
+"""MD 图片引用提取：一遍扫描全文，跳过代码块与行内代码，返回结构化的引用。
+
+支持的写法：
+    ![文字](路径)  ![文字](<含空格 的路径> "标题")  ![文字](路径 '标题' / (标题))   kind = 'inline'
+    ![文字][id]  ![文字][]  ![id]，配合 [id]: 路径 "标题"                   kind = 'reference'
+    <img src="路径"> / <img src='路径'> / <img src=路径>                    kind = 'html'
+
+start/end 为路径本身（不含 <>、引号与标题）在全文中的位置，改写时只替换这一段；
+引用式图片的位置指向 [id]: 定义行中的路径，多处引用同一定义时共用同一段。
+围栏代码块（``` / ~~~）与行内代码（`…`）内的内容不视为引用；缩进代码块不识别，
+因为列表中缩进的图片远比缩进代码块常见。
+
+主扫描是一个以 "![" 为字面前缀的正则，正则引擎可直接跳过正文；只有文档中出现反引号 / ~~~、
+<img 或引用式图片时才做相应的额外处理，代码区的识别整体线性，行内代码只在段落内配对。
+它仍比原先的图片正则（bench 中的 _LEGACY_IMAGE）findall 慢：bench 的合成笔记库上（1000 篇约 850 KB，
+python -m md_assistant.bench --ops parse），image_paths 约为其 1.7～2.5 倍、image_refs 约 4 倍；
+三成段落含行内代码时（--code 0.3）分别约 3.5 倍、5 倍，多出的时间主要花在逐段识别行内代码上。
+"""
+import re
+from bisect import bisect_right
+from collections import namedtuple
+
+ImageRef = namedtuple("ImageRef", "kind path start end title")
+
+# ![文字](括号内) / ![文字][id] / ![文字][] / ![id]；文字与括号内各允许一层嵌套括号。
+# 括号内整体取出后再拆出 <路径> 与 "标题"，正则里只有简单的字符类重复
+_IMAGE = re.compile(r'!\[(?P<alt>[^\[\]\n]*(?:\[[^\[\]\n]*\][^\[\]\n]*)*)\]'
+                    r'(?:\((?P<inner>[^()\n]*(?:\([^()\n]*\)[^()\n]*)*)\)|\[(?P<label>[^\]\n]*)\])?')
+# 快速路径：括号内是不含空白、引号、<> 的普通路径时第 1 组即为路径；其他写法（含引用式）第 1 组为空，需完整解析。
+# 单独 findall 的速度与原先的正则相当
+_SIMPLE = re.compile(r'!\[[^\[\]\n]*(?:\[[^\[\]\n]*\][^\[\]\n]*)*\]'
+                     r'(?:\((?:([^()\s<>"\']+)\)|[^()\n]*(?:\([^()\n]*\)[^()\n]*)*\)))?')
+_TITLE = re.compile(r'\s+("[^"\n]*"|\'[^\'\n]*\'|\([^()\n]*\))$')
+_DEF = re.compile(r'[ \t]{0,3}\[(?!\^)(?P<label>[^\]\n]+)\]:[ \t]*(?:<(?P<a>[^>\n]*)>|(?P<p>\S+))'
+                  r'(?:[ \t]+(?P<t>"[^"\n]*"|\'[^\'\n]*\'|\([^)\n]*\)))?[ \t]*$', re.M)
+_HTML = re.compile(r'<img\b[^>]*?\ssrc\s*=\s*(?:"(?P<q>[^"]*)"|\'(?P<s>[^\']*)\'|(?P<b>[^\s>"\']+))', re.I)
+_HAS_HTML = re.compile(r'<img\b', re.I)
+_RUN = {'`': re.compile(r'`+'), '~': re.compile(r'~+')}
+# 段落的结束：空行、ATX 标题或围栏开始的行（与 CommonMark 一致，行内代码不能跨过它们）
+_BLOCK = re.compile(r'\n(?:[ \t]*(?:\n|$)| {0,3}(?:#{1,6}(?:[ \t]|$)|```|~~~))', re.M)
+
+
+def _fence_start(txt, i):
+    """i 前只有不超过 3 个空格/制表符（位于行首）时才可能是围栏；只回看 4 个字符，长行上也是常数时间"""
+    ls = txt.rfind('\n', max(0, i - 4), i) + 1
+    if ls == 0 and i > 3: return False
+    return not txt[ls:i].strip(" \t")
+
+
+def _fence_end(txt, pos, ch, n):
+    """pos 之后首个只含 ≥n 个 ch 的行（结束围栏）的行尾；没有则到文末"""
+    i = txt.find(ch * n, pos)
+    while i >= 0:
+        e = _RUN[ch].match(txt, i).end()
+        if _fence_start(txt, i):
+            le = txt.find('\n', e)
+            if le < 0: le = len(txt)
+            if not txt[e:le].strip(" \t\r"): return le
+        i = txt.find(ch * n, e)
+    return len(txt)
+
+
+def code_regions(txt):
+    """围栏代码块与行内代码的 [(起点, 终点)]，按位置排序、互不重叠。
+
+    行内代码只在所在段落内配对：段落中缺闭合的反引号按普通字符处理，不会把后面段落里的图片当成代码。
+    整体线性：下一个 ~~~ 与下一个段落结束的位置只在 pos 越过它们之后才重新查找；
+    同一段落中某长度的反引号串一旦找不到闭合，之后同长度的串直接按普通字符处理，不再向后搜索。
+    """
+    out, pos, n = [], 0, len(txt)
+    j = txt.find('~~~')
+    b = -1             # 当前段落的结束位置
+    unclosed = set()   # 当前段落中已确认其后没有闭合串的反引号串长度
+    while True:
+        i = txt.find('`', pos)
+        if 0 <= j < pos: j = txt.find('~~~', pos)
+        if j >= 0 and (i < 0 or j < i):   # ~~~ 只可能是围栏
+            e = _RUN['~'].match(txt, j).end()
+            if _fence_start(txt, j):
+                pos = _fence_end(txt, e, '~', e - j)
+                out.append((j, pos))
+            else:
+                pos = e
+            continue
+        if i < 0: return out
+        e = i + 1
+        if e < n and txt[e] == '`': e = _RUN['`'].match(txt, e).end()
+        k = e - i
+        if k >= 3 and _fence_start(txt, i):
+            le = txt.find('\n', e)
+            if '`' not in txt[e:le if le >= 0 else n]:   # 信息串中不能有反引号
+                pos = _fence_end(txt, e, '`', k)
+                out.append((i, pos))
+                continue
+        # 行内代码：与本段落内下一个等长的反引号串配对，找不到则按普通字符处理
+        if b < e:
+            m = _BLOCK.search(txt, e)
+            b = m.start() if m else n
+            unclosed.clear()
+        c = -1 if k in unclosed else txt.find('`' * k, e, b)
+        while c >= 0 and c + k < n and txt[c + k] == '`':
+            c = txt.find('`' * k, _RUN['`'].match(txt, c).end(), b)
+        if c >= 0:
+            pos = c + k
+            out.append((i, pos))
+        else:
+            unclosed.add(k)
+            pos = e
+
+
+def _label(s): return " ".join(s.split()).casefold()
+
+
+def _split(inner):
+    """![文字](…) 括号内 -> (路径, 路径在 inner 中的偏移, 标题)；路径两侧的空白与 <> 不计入"""
+    s = inner.strip()
+    off, title = len(inner) - len(inner.lstrip()), None
+    if s[-1:] in ('"', "'", ')'):
+        t = _TITLE.search(s)
+        if t: title, s = t.group(1)[1:-1], s[:t.start()]
+    if s[:1] == '<' and s[-1:] == '>': s, off = s[1:-1], off + 1
+    return s, off, title
+
+
+def _inline(m):
+    path, off, title = _split(m.group('inner'))
+    s = m.start('inner') + off
+    return ImageRef('inline', path, s, s + len(path), title)
+
+
+def _def(m):
+    """定义行 -> (路径, 起点, 终点, 标题)"""
+    g = 'a' if m.group('a') is not None else 'p'
+    t = m.group('t')
+    return m.group(g), m.start(g), m.end(g), t[1:-1] if t else None
+
+
+def _definitions(txt, in_code):
+    """[id]: 路径 "标题" 定义，{标签: (路径, 起点, 终点, 标题)}；同一标签以首个定义为准"""
+    out, i = {}, txt.find(']:')
+    while i >= 0:
+        ls = txt.rfind('\n', 0, i) + 1
+        m = _DEF.match(txt, ls)
+        if m and not in_code(ls):
+            out.setdefault(_label(m.group('label')), _def(m))
+        le = txt.find('\n', i)   # 每行至多一个定义，直接跳到下一行
+        if le < 0: break
+        i = txt.find(']:', le)
+    return out
+
+
+def _outside(ms, code):
+    """丢弃起点落在代码区内的 match；两者都按位置有序，一次归并完成"""
+    out, k, n = [], 0, len(code)
+    for m in ms:
+        i = m.start()
+        while k < n and code[k][1] <= i: k += 1
+        if k < n and code[k][0] <= i: continue
+        out.append(m)
+    return out
+
+
+def _may_have_code(txt):
+    """没有反引号也没有 ~~~ 的笔记不可能有代码区，跳过 code_regions"""
+    return '`' in txt or '~~~' in txt
+
+
+def outside_code(rx, txt):
+    """rx.finditer(txt) 中起点不在代码块 / 行内代码内的 match 列表；用于笔记间链接等非图片的写法"""
+    ms = rx.finditer(txt)
+    code = code_regions(txt) if _may_have_code(txt) else []
+    return _outside(ms, code) if code else list(ms)
+
+
+def _scan(txt):
+    """(代码区, 代码区外的 _SIMPLE match 列表, 是否含 <img)"""
+    code = code_regions(txt) if _may_have_code(txt) else []
+    ms = _SIMPLE.finditer(txt)
+    ms = _outside(ms, code) if code else list(ms)
+    return code, ms, '<' in txt and _HAS_HTML.search(txt) is not None
+
+
+def image_refs(txt):
+    """返回 txt 中全部图片引用 [ImageRef]，按出现顺序；空路径不计"""
+    if '<' not in txt and not _may_have_code(txt) and ']:' not in txt:
+        # 快速路径：没有代码区、<img 与引用定义时，全部是 ![文字](普通路径) 的笔记直接构造结果
+        ms = list(_SIMPLE.finditer(txt))
+        if all(m.group(1) is not None for m in ms):
+            return [ImageRef('inline', m.group(1), m.start(1), m.end(1), None) for m in ms]
+    code, ms, html = _scan(txt)
+    found, labels, simple = [], False, True   # found: [(位置, ImageRef 或 引用式图片的标签)]
+    for m in ms:
+        if m.group(1) is not None:
+            found.append((m.start(), ImageRef('inline', m.group(1), *m.span(1), None))); continue
+        simple = False
+        m = _IMAGE.match(txt, m.start())
+        if m.group('inner') is not None:
+            r = _inline(m)
+            if r.path: found.append((m.start(), r))
+        else:   # ![文字][] 与 ![id] 以文字本身为标签；定义可能在后文，最后统一解析
+            found.append((m.start(), _label(m.group('label') or m.group('alt'))))
+            labels = True
+    if simple and not html: return [r for _, r in found]
+    starts = [c[0] for c in code]
+
+    def in_code(i):
+        k = bisect_right(starts, i) - 1
+        return k >= 0 and i < code[k][1]
+
+    if html:
+        n = len(found)
+        for m in _HTML.finditer(txt):
+            g = m.lastgroup
+            if m.group(g) and not (code and in_code(m.start())):
+                found.append((m.start(), ImageRef('html', m.group(g), m.start(g), m.end(g), None)))
+        if len(found) > n: found.sort(key=lambda x: x[0])
+    if not labels: return [r for _, r in found]
+    defined = _definitions(txt, in_code)
+    out = []
+    for _, r in found:
+        if isinstance(r, str):
+            d = defined.get(r)
+            if not d or not d[0]: continue
+            r = ImageRef('reference', *d)
+        out.append(r)
+    return out
+
+
+def image_paths(txt, refs=None):
+    """txt 中引用的图片路径，按首次出现顺序去重；refs 为已提取的 image_refs(txt) 时直接使用"""
+    if refs is None:
+        # 快速路径：全部是 ![文字](普通路径) 时不构造 ImageRef
+        if '<' not in txt and not _may_have_code(txt):
+            paths = _SIMPLE.findall(txt)
+            if '' not in paths: return list(dict.fromkeys(paths))
+        else:
+            _, ms, html = _scan(txt)
+            paths = [m.group(1) for m in ms]
+            if not html and None not in paths: return list(dict.fromkeys(paths))
+        refs = image_refs(txt)
+    return list(dict.fromkeys(r.path for r in refs))
+
+
+def rewrite_paths(txt, mapping, refs=None):
+    """单遍改写：路径在 mapping 中的引用替换为 mapping[路径]，其余原样保留；同一段（共用的定义）只改一次"""
+    if not mapping: return txt
+    out, last = [], 0
+    for start, end, path in sorted({(r.start, r.end, r.path) for r in (refs if refs is not None else image_refs(txt))}):
+        new = mapping.get(path)
+        if new is None or start < last: continue
+        out.append(txt[last:start]); out.append(new)
+        last = end
+    if not out: return txt
+    out.append(txt[last:])
+    return "".join(out)
@@ -0,0 +1,165 @@
+"""后台任务调度：固定大小的工作线程池 + 优先级队列，每个任务一个取消标志。
+
+- 优先级数值越小越先执行：用户操作 PRIORITY_USER 先于预览 PRIORITY_PREVIEW。
+- key 相同的任务互相合并：提交新任务时，队列中尚未开始的同 key 任务被丢弃，正在运行的收到取消。
+- exclusive=True 的任务（迁移、整理、清理等大量读写磁盘的操作）彼此不并发，排队依次执行，
+  但不阻塞审计、预览等其他任务。
+- 通过 changed(运行数, 排队数) / finished(Task) 事件报告队列深度与每个任务的排队、运行耗时；
+  尚未开始就被取消或合并掉的任务同样报告 finished（state 为 cancelled）。
+"""
+import heapq
+import itertools
+import threading
+import time
+
+from .events import Signal
+
+SCHEDULER_WORKERS = 3   # 一个独占的磁盘任务 + 审计/监视 + 预览
+PRIORITY_USER     = 0
+PRIORITY_PREVIEW  = 10
+
+
+class Task:
+    """一个已提交的任务；fn(token) 在工作线程中执行，token 为该任务专属的 threading.Event"""
+
+    def __init__(self, name, fn, priority, key, exclusive):
+        self.name, self.fn, self.priority, self.key, self.exclusive = name, fn, priority, key, exclusive
+        self.token = threading.Event()
+        self.state = "queued"   # queued / running / done / failed / cancelled
+        self.error = None
+        self.submitted, self.started, self.ended = time.monotonic(), None, None
+
+    def cancel(self): self.token.set()
+
+    @property
+    def waited(self): return (self.started or time.monotonic()) - self.submitted
+
+    @property
+    def elapsed(self): return (self.ended or time.monotonic()) - self.started if self.started else 0.0
+
+
+class TaskScheduler:
+    changed  = Signal(int, int)   # (运行中, 排队中)
+    finished = Signal(object)     # (Task,)
+
+    def __init__(self, workers=SCHEDULER_WORKERS):
+        self.workers = workers
+        self._heap, self._held = [], []   # _held：等待前一个独占任务结束的独占任务
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = set()
+        self._exclusive_busy = False
+        self._threads = []
+        self._closed = False
+
+    # --- 提交与取消 ---
+    def submit(self, name, fn, priority=PRIORITY_USER, key=None, exclusive=False):
+        task = Task(name, fn, priority, key, exclusive)
+        with self._cond:
+            if key is not None:
+                for t in self._running:
+                    if t.key == key: t.cancel()
+                stale = self._drop(lambda t: t.key == key)
+            else:
+                stale = []
+            heapq.heappush(self._heap, (priority, next(self._seq), task))
+            if len(self._threads) < self.workers:
+                th = threading.Thread(target=self._work, name=f"md-worker-{len(self._threads)}", daemon=True)
+                self._threads.append(th); th.start()
+            self._cond.notify()
+            depth = self._depth()
+        for t in stale: self.finished.emit(t)
+        self.changed.emit(*depth)
+        return task
+
+    def cancel(self, task):
+        """取消任务：排队中的立即移出队列并报告 finished，运行中的设置其取消标志"""
+        if task is None: return
+        task.cancel()
+        with self._cond:
+            dropped = self._drop(lambda t: t is task)
+            self._cond.notify_all()
+            depth = self._depth()
+        self._report(dropped, depth)
+
+    def cancel_all(self):
+        with self._cond:
+            dropped = self._drop(lambda t: True)
+            for t in self._running: t.cancel()
+            self._cond.notify_all()
+            depth = self._depth()
+        self._report(dropped, depth)
+
+    def _drop(self, pred):
+        """把排队中（含等待独占的）满足 pred 的任务移出队列并标记为已取消，返回这些任务；调用方持有 _cond"""
+        dropped = [e[2] for e in self._heap if pred(e[2])] + [t for t in self._held if pred(t)]
+        if not dropped: return dropped
+        self._heap = [e for e in self._heap if not pred(e[2])]
+        heapq.heapify(self._heap)
+        self._held = [t for t in self._held if not pred(t)]
+        now = time.monotonic()
+        for t in dropped:
+            t.cancel()
+            t.state, t.ended = "cancelled", now
+        return dropped
+
+    def _report(self, dropped, depth):
+        for t in dropped: self.finished.emit(t)
+        if dropped: self.changed.emit(*depth)
+
+    def shutdown(self):
+        self.cancel_all()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # --- 统计 ---
+    def _depth(self): return len(self._running), len(self._heap) + len(self._held)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "running": [(t.name, round(t.elapsed, 2)) for t in self._running],
+                "queued":  [e[2].name for e in sorted(self._heap)] + [t.name for t in self._held],
+            }
+
+    # --- 工作线程 ---
+    def _next(self):
+        """取下一个可执行的任务；调用方持有 _cond"""
+        while True:
+            if self._closed: return None
+            while self._heap:
+                _, _, task = heapq.heappop(self._heap)
+                if task.token.is_set():
+                    task.state = "cancelled"; continue
+                if task.exclusive and self._exclusive_busy:
+                    self._held.append(task); continue
+                return task
+            self._cond.wait()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                task = self._next()
+                if task is None: return
+                if task.exclusive: self._exclusive_busy = True
+                task.state, task.started = "running", time.monotonic()
+                self._running.add(task)
+                depth = self._depth()
+            self.changed.emit(*depth)
+            try:
+                task.fn(task.token)
+                task.state = "cancelled" if task.token.is_set() else "done"
+            except Exception as e:
+                task.state, task.error = "failed", e
+            task.ended = time.monotonic()
+            with self._cond:
+                self._running.discard(task)
+                if task.exclusive:
+                    self._exclusive_busy = False
+                    for t in self._held: heapq.heappush(self._heap, (t.priority, next(self._seq), t))
+                    self._held.clear()
+                    self._cond.notify_all()
+                depth = self._depth()
+            self.finished.emit(task)
+            self.changed.emit(*depth)
@@ -0,0 +1,129 @@
+"""文件夹变更监视：Linux 下用 inotify（ctypes 调用 libc，无额外依赖），其他平台退化为轮询。
+
+只监视文件夹顶层（与原地整理的处理范围一致），变更按文件名汇总，静默 debounce 秒后成批交付。
+"""
+import os
+import sys
+import time
+import select
+import struct
+
+WATCH_DEBOUNCE = 1.0   # 最后一次变更后静默多久才处理（秒）
+WATCH_POLL     = 2.0   # 轮询后端的扫描间隔（秒）
+_IDLE_WAIT     = 0.5   # 无待处理变更时检查停止标志的间隔（秒）
+
+# <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO    = 0x00000080
+_IN_CLOEXEC     = 0o2000000
+_IN_NONBLOCK    = 0o4000
+_EVENT_HDR      = struct.Struct("iIII")   # wd, mask, cookie, len
+
+
+class _InotifyBackend:
+    name = "inotify"
+
+    def __init__(self, folder):
+        import ctypes, ctypes.util   # 仅 Linux 监视模式用到，延迟导入
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        # 写完关闭 / 移入（编辑器原子保存、粘贴截图）都视为变更
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, "inotify_add_watch 失败")
+
+    def wait(self, timeout, stop):
+        r, _, _ = select.select([self.fd], [], [], timeout)
+        if not r: return set()
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        names, i = set(), 0
+        while i + _EVENT_HDR.size <= len(buf):
+            _, _, _, ln = _EVENT_HDR.unpack_from(buf, i)
+            i += _EVENT_HDR.size
+            name = buf[i:i + ln].rstrip(b"\0")
+            i += ln
+            if name: names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollBackend:
+    name = "轮询"
+
+    def __init__(self, folder, interval=WATCH_POLL):
+        self.folder = folder
+        self.interval = interval
+        self._state = self._snapshot()
+        self._next = time.monotonic() + interval
+
+    def _snapshot(self):
+        state = {}
+        try:
+            with os.scandir(self.folder) as it:
+                for e in it:
+                    try:
+                        if e.is_file():
+                            st = e.stat()
+                            state[e.name] = (st.st_mtime_ns, st.st_size)
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+        return state
+
+    def wait(self, timeout, stop):
+        now = time.monotonic()
+        if now < self._next:   # 未到扫描时间：只等待，不触碰磁盘
+            stop.wait(min(timeout, self._next - now))
+            return set()
+        self._next = now + self.interval
+        new = self._snapshot()
+        changed = {n for n, v in new.items() if self._state.get(n) != v}
+        self._state = new
+        return changed
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    """监视 folder 顶层文件变更，batches(stop) 逐批产出变更文件名集合"""
+
+    def __init__(self, folder, debounce=WATCH_DEBOUNCE, poll=False):
+        self.debounce = debounce
+        self.backend = None
+        if sys.platform.startswith("linux") and not poll:
+            try:
+                self.backend = _InotifyBackend(folder)
+            except (OSError, AttributeError):
+                self.backend = None
+        if self.backend is None:
+            self.backend = _PollBackend(folder)
+
+    @property
+    def backend_name(self): return self.backend.name
+
+    def batches(self, stop):
+        pending, deadline = set(), None
+        while not stop.is_set():
+            now = time.monotonic()
+            timeout = _IDLE_WAIT if deadline is None else max(0.0, min(_IDLE_WAIT, deadline - now))
+            names = self.backend.wait(timeout, stop)
+            now = time.monotonic()
+            if names:
+                pending |= names
+                deadline = now + self.debounce
+            if pending and now >= deadline and not stop.is_set():
+                yield pending
+                pending, deadline = set(), None
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,142 @@
+"""fetch.py 的并发下载、单主机并发上限、大小与类型拦截，以及迁移时下载缓存的 304 复验。
+远程图片由本机临时的 ThreadingHTTPServer 提供，不访问外网。"""
+import hashlib
+import http.server
+import os
+import threading
+import time
+
+import pytest
+
+from md_assistant.core import MarkdownLogicCore
+from md_assistant.fetch import RemoteFetcher
+
+_PNG = b"\x89PNG\r\n\x1a\n"
+_BIG = 2 * 1024 * 1024   # 超过测试中 1 MB 上限的响应体
+
+
+class _Server:
+    """/img/<名称>：带 ETag 的 PNG，If-None-Match 相同时返回 304；/html：text/html；
+    /big：Content-Length 超限；/stream：不带 Content-Length、实际超限。每个请求先等待 latency 秒"""
+
+    def __init__(self):
+        self.latency = 0.0
+        self.hits, self.not_modified = [], 0
+        self.inflight = self.max_inflight = 0
+        self._lock = threading.Lock()
+        srv = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                with srv._lock:
+                    srv.hits.append(self.path)
+                    srv.inflight += 1
+                    srv.max_inflight = max(srv.max_inflight, srv.inflight)
+                try:
+                    if srv.latency: time.sleep(srv.latency)
+                    self._respond()
+                finally:
+                    with srv._lock: srv.inflight -= 1
+
+            def _respond(self):
+                if self.path.startswith("/img/"):
+                    etag = f'"{self.path}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        with srv._lock: srv.not_modified += 1
+                        self.send_response(304); self.send_header("ETag", etag); self.end_headers()
+                        return
+                    self._send(_PNG + self.path.encode() * 64, "image/png",
+                               ETag=etag, **{"Cache-Control": "max-age=0"})
+                elif self.path == "/html":
+                    self._send(b"<html></html>", "text/html; charset=utf-8")
+                elif self.path == "/big":
+                    self._send(_PNG * (_BIG // len(_PNG)), "image/png")
+                elif self.path == "/stream":
+                    self.send_response(200); self.send_header("Content-Type", "image/png"); self.end_headers()
+                    try:
+                        for _ in range(_BIG // 65536): self.wfile.write(b"\0" * 65536)
+                    except OSError:   # 客户端中途断开
+                        pass
+                else:
+                    self.send_error(404)
+
+            def _send(self, body, ctype, **headers):
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in headers.items(): self.send_header(k, v)
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except OSError:
+                    pass
+
+            def log_message(self, *a): pass
+
+        self._srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._srv.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._srv.server_address[1]}"
+        threading.Thread(target=self._srv.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._srv.shutdown(); self._srv.server_close()
+
+
+@pytest.fixture
+def server():
+    s = _Server()
+    yield s
+    s.close()
+
+
+def _fetch_all(fetcher, urls, tdir):
+    futs = [fetcher.submit(fetcher.fetch_to_temp, u, tdir) for u in urls]
+    return [f.result() for f in futs]
+
+
+def test_parallel_fetch(server, tmp_path):
+    server.latency = 0.2
+    urls = [f"{server.url}/img/{i}.png" for i in range(8)]
+    with RemoteFetcher(workers=8, per_host=8) as fetcher:
+        t = time.perf_counter()
+        results = _fetch_all(fetcher, urls, str(tmp_path))
+        elapsed = time.perf_counter() - t
+    assert elapsed < 0.2 * len(urls) / 2   # 逐个下载需 1.6 秒
+    for u, (tmp, headers, sha1) in zip(urls, results):
+        with open(tmp, "rb") as f: data = f.read()
+        assert data == _PNG + u[len(server.url):].encode() * 64
+        assert sha1 == hashlib.sha1(data).hexdigest() and headers["ETag"]
+
+
+def test_per_host_limit(server, tmp_path):
+    server.latency = 0.1
+    with RemoteFetcher(workers=8, per_host=2) as fetcher:
+        _fetch_all(fetcher, [f"{server.url}/img/{i}.png" for i in range(8)], str(tmp_path))
+    assert server.max_inflight == 2
+
+
+@pytest.mark.parametrize("path, message", [("/html", "非图片类型"), ("/big", "文件过大"), ("/stream", "文件超过")])
+def test_rejected(server, tmp_path, path, message):
+    with RemoteFetcher(max_mb=1) as fetcher:
+        with pytest.raises(ValueError, match=message):
+            fetcher.fetch_to_temp(server.url + path, str(tmp_path))
+    assert os.listdir(tmp_path) == []   # 中止时不留下临时文件
+
+
+def test_revalidate_cached(server, tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    (src / "note.md").write_text(f"![远程]({server.url}/img/a.png)\n", encoding="utf-8")
+    cfg = {'merge': False, 'subfolder': True, 'download': True, 'cleanup': False,
+           'download_cache': str(dst / "cache.json")}
+    for _ in range(2):
+        core = MarkdownLogicCore(undo_path=None)
+        done = []
+        core.task_finished.connect(lambda ok, msg: done.append(ok))
+        core.process_migration(str(src), str(dst), cfg)
+        assert done == [True]
+    # 第二次带 If-None-Match 复验，服务器返回 304，沿用第一次下载的文件
+    assert len(server.hits) == 2 and server.not_modified == 1
+    assert core.stats.counters.get("not_modified") == 1
+    assert [p.name for p in dst.rglob("*.png")] == ["a.png"]
+    assert (dst / "note.md").read_text(encoding="utf-8") == "![远程](./images/note/a.png)\n"
@@ -0,0 +1,119 @@
+"""journal.py 的崩溃恢复（回滚 / 补做）、进行中日志的保护，以及操作出错时的自动回滚。
+崩溃由子进程在操作中途 os._exit 模拟，日志与文件原样留在磁盘上。"""
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from md_assistant.core import MarkdownLogicCore
+from md_assistant.journal import JOURNAL_DIR, Journal, JournalPending, held, pending, recover
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# a.md 的图片移入 images/ 并改写完成；b.md 的图片已移走、改写前进程退出
+_CRASH = """
+    import os, sys
+    from md_assistant.journal import Journal
+    root = sys.argv[1]
+    j = Journal(root, "inplace")
+    os.makedirs(os.path.join(root, "images"))
+    for note in ("a", "b"):
+        md = os.path.join(root, note + ".md")
+        j.move(os.path.join(root, note + ".png"), os.path.join(root, "images", note + "_1.png"), md)
+        if note == "b": os._exit(1)
+        j.write_text(md, f"![{note}](./images/{note}_1.png)\\n", md)
+"""
+
+
+def _files(root):
+    out = {}
+    for r, ds, fs in os.walk(root):
+        ds[:] = [d for d in ds if d != JOURNAL_DIR]
+        for f in fs:
+            p = os.path.join(r, f)
+            with open(p, "r", encoding="utf-8") as fh:
+                out[os.path.relpath(p, root).replace(os.sep, "/")] = fh.read()
+    return out
+
+
+@pytest.fixture
+def crashed(tmp_path):
+    for note in ("a", "b"):
+        (tmp_path / f"{note}.md").write_text(f"![{note}]({note}.png)\n", encoding="utf-8")
+        (tmp_path / f"{note}.png").write_text(note, encoding="utf-8")
+    before = _files(tmp_path)
+    env = dict(os.environ, PYTHONPATH=REPO)
+    p = subprocess.run([sys.executable, "-c", textwrap.dedent(_CRASH), str(tmp_path)], env=env)
+    assert p.returncode == 1
+    return tmp_path, before
+
+
+def test_rollback(crashed):
+    root, before = crashed
+    assert not held(root) and pending(root) == "inplace"
+    kind, n = recover(root)
+    assert kind == "inplace" and n == 3
+    assert _files(root) == before
+    assert not (root / JOURNAL_DIR).exists() and pending(root) is None
+
+
+def test_replay(crashed):
+    root, _ = crashed
+    kind, n = recover(root, replay=True)
+    # a.md 已完整执行，保留；b.md 的图片移走了但链接未改写，移动被撤销
+    assert kind == "inplace" and n == 1
+    assert _files(root) == {"a.md": "![a](./images/a_1.png)\n", "images/a_1.png": "a",
+                            "b.md": "![b](b.png)\n", "b.png": "b"}
+    assert not (root / JOURNAL_DIR).exists()
+
+
+def test_live_journal(tmp_path):
+    (tmp_path / "x.png").write_text("x", encoding="utf-8")
+    j = Journal(tmp_path, "cleanup")
+    j.move(str(tmp_path / "x.png"), str(tmp_path / "y.png"))
+    # 进行中的操作：不能当作中断处理，也不能开始另一个操作
+    assert held(tmp_path)
+    for fn in (pending, recover, lambda r: Journal(r, "inplace")):
+        with pytest.raises(JournalPending):
+            fn(tmp_path)
+    assert (tmp_path / "y.png").exists()
+    j.commit()
+    assert not held(tmp_path) and pending(tmp_path) is None
+    assert not (tmp_path / JOURNAL_DIR).exists()
+
+
+def test_error_rolls_back(tmp_path):
+    (tmp_path / "a.png").write_text("a", encoding="utf-8")
+    (tmp_path / "a.md").write_text("![a](a.png)\n", encoding="utf-8")
+    (tmp_path / "z.md").write_bytes(b"\xff\xfe ![a](a.png)\n")   # 非 UTF-8
+    before = _files_bytes(tmp_path)
+    core = MarkdownLogicCore(undo_path=None)
+    done = []
+    core.task_finished.connect(lambda ok, msg: done.append(ok))
+    core.process_inplace(str(tmp_path), False)
+    assert done == [False]
+    assert _files_bytes(tmp_path) == before and len(core.history) == 0
+    assert not (tmp_path / JOURNAL_DIR).exists()
+
+
+def test_migrate_skips_undecodable(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    (src / "a.png").write_text("a", encoding="utf-8")
+    (src / "a.md").write_text("![a](a.png)\n", encoding="utf-8")
+    (src / "z.md").write_bytes(b"\xff\xfe ![a](a.png)\n")
+    core = MarkdownLogicCore(undo_path=None)
+    done = []
+    core.task_finished.connect(lambda ok, msg: done.append(ok))
+    cfg = {'merge': False, 'subfolder': True, 'download': False, 'cleanup': False}
+    core.process_migration(str(src), str(dst), cfg)
+    assert done == [True] and core.stats.counters.get("skipped") == 1
+    assert _files(dst) == {"a.md": "![a](./images/a/a.png)\n", "images/a/a.png": "a"}
+    assert not (dst / JOURNAL_DIR).exists()
+
+
+def _files_bytes(root):
+    return {p.relative_to(root).as_posix(): p.read_bytes() for p in root.rglob("*")
+            if p.is_file() and JOURNAL_DIR not in p.parts}
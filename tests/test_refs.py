@@ -0,0 +1,60 @@
+"""refs.py 的提取与改写：corpus/ 中每个用例一对 <名称>.md / <名称>.expected.md，
+cases.json 给出应提取的引用 [kind, path, title] 与改写用的 {旧路径: 新路径}。"""
+import json
+import os
+import re
+import time
+
+import pytest
+
+from md_assistant.refs import code_regions, image_paths, image_refs, outside_code, rewrite_paths
+
+CORPUS = os.path.join(os.path.dirname(__file__), "corpus")
+with open(os.path.join(CORPUS, "cases.json"), "r", encoding="utf-8") as f:
+    CASES = json.load(f)
+
+
+def _read(name):
+    with open(os.path.join(CORPUS, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_refs(name):
+    txt = _read(name + ".md")
+    refs = image_refs(txt)
+    assert [[r.kind, r.path, r.title] for r in refs] == CASES[name]["refs"]
+    assert all(txt[r.start:r.end] == r.path for r in refs)
+    assert image_paths(txt) == list(dict.fromkeys(r.path for r in refs))
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_rewrite(name):
+    txt = _read(name + ".md")
+    assert rewrite_paths(txt, CASES[name]["mapping"]) == _read(name + ".expected.md")
+    assert rewrite_paths(txt, {}) == txt
+
+
+def test_code_regions_stray_markers():
+    # 行首以外的 ~~~ 与缺闭合的 ``` 不是代码；它们也不应让之后的每段行内代码都重新搜索到文末（原先约 2 秒）
+    txt = "a ~~~ b ``` c\n" + "`x` ![i](p.png)\n" * 20000
+    t = time.perf_counter()
+    regions = code_regions(txt)
+    assert time.perf_counter() - t < 1.0
+    assert len(regions) == 20000 and regions[0] == (14, 17)
+    assert len(image_refs(txt)) == 20000
+
+
+def test_links_in_code():
+    link = re.compile(r'(?<!!)\[[^\]\n]*\]\(([^)\s]+)\)')
+    txt = "[a](x.md) `[b](y.md)`\n```\n[c](z.md)\n```\n"
+    assert [m.group(1) for m in outside_code(link, txt)] == ["x.md"]
+
+
+def test_stray_backtick():
+    # 落单的反引号不能跨过空行与后面段落里的反引号配对，把中间的图片当成代码
+    txt = "Press the ` key.\n\n![s](images/real.png)\n\nRun `ls`."
+    assert code_regions(txt) == [(45, 49)]
+    assert image_paths(txt) == ["images/real.png"]
+    txt = "a ` b\n# 标题 ![h](h.png) `c`\n"
+    assert image_paths(txt) == ["h.png"]
@@ -0,0 +1,57 @@
+"""批量重命名的两阶段移动：目标恰好是另一个待改名的源（链式 1→2→3、互换 a↔b、三元环）时不丢失、不覆盖文件，
+撤销后恢复原状。"""
+import os
+
+import pytest
+
+from md_assistant.core import MarkdownLogicCore
+
+
+def _notes(folder):
+    out = {}
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".md"):
+            with open(os.path.join(folder, name), "r", encoding="utf-8") as f:
+                out[name] = f.read()
+    return out
+
+
+@pytest.fixture
+def core():
+    c = MarkdownLogicCore(undo_path=None)
+    c.results = []
+    c.task_finished.connect(lambda ok, msg: c.results.append((ok, msg)))
+    return c
+
+
+def test_chain(core, tmp_path):
+    # 1→2、2→3、3→4：每个目标都是另一个源
+    for i in (1, 2, 3):
+        (tmp_path / f"{i}.md").write_text(f"note {i}", encoding="utf-8")
+    core.execute_rename_batch(str(tmp_path), "{num}", 2, 1)
+    assert core.results == [(True, "成功重命名 3 个文件")]
+    assert _notes(tmp_path) == {"2.md": "note 1", "3.md": "note 2", "4.md": "note 3"}
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".mvtmp")]
+    core.undo_last()
+    assert core.results[-1] == (True, "已撤销 3 个文件")
+    assert _notes(tmp_path) == {"1.md": "note 1", "2.md": "note 2", "3.md": "note 3"}
+
+
+def test_chain_relinks(core, tmp_path):
+    (tmp_path / "1.md").write_text("[下一篇](2.md)", encoding="utf-8")
+    (tmp_path / "2.md").write_text("[上一篇](1.md)", encoding="utf-8")
+    core.execute_rename_batch(str(tmp_path), "{num}", 2, 1, str(tmp_path))
+    assert _notes(tmp_path) == {"2.md": "[下一篇](3.md)", "3.md": "[上一篇](2.md)"}
+    core.undo_last()
+    assert _notes(tmp_path) == {"1.md": "[下一篇](2.md)", "2.md": "[上一篇](1.md)"}
+
+
+@pytest.mark.parametrize("cycle", [["a", "b"], ["a", "b", "c"]])
+def test_cycle(core, tmp_path, cycle):
+    # a↔b 与 a→b→c→a：没有哪个目标是空闲的，必须先全部移到临时名
+    for n in cycle:
+        (tmp_path / f"{n}.md").write_text(n, encoding="utf-8")
+    pairs = [(str(tmp_path / f"{s}.md"), str(tmp_path / f"{t}.md")) for s, t in zip(cycle, cycle[1:] + cycle[:1])]
+    assert [err for _, _, err in core._two_phase(pairs)] == [None] * len(cycle)
+    assert _notes(tmp_path) == {f"{t}.md": s for s, t in zip(cycle, cycle[1:] + cycle[:1])}
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{n}.md" for n in cycle)